@@ -0,0 +1,323 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import doodle_sim
+import maze_sim
+from doodle_batch import BatchSimulation
+from qnetwork import BACKENDS
+
+SEED = 0
+ITERATIONS = 5000
+WARMUP = 200
+MEMORY_ITERATIONS = 500
+BATCH_COUNT = 256
+TOLERANCE = 0.2
+# Transitions mises dans le tampon avant de chronométrer train
+REPLAY_FILL = 1024
+IMPORT_ITERATIONS = 20
+
+# Chaque benchmark renvoie une fonction à chronométrer et le nombre d'éléments traités par appel
+
+def doodle_tick(backend):
+
+    simulation = doodle_sim.Simulation(seed=SEED)
+    rng = random.Random(SEED)
+
+    return lambda: simulation.update_game(rng.choice(doodle_sim.ACTIONS)), 1
+
+def doodle_step(backend):
+
+    simulation = doodle_sim.Simulation(seed=SEED)
+    rng = random.Random(SEED)
+
+    return lambda: simulation.step(rng.choice(doodle_sim.ACTIONS)), 1
+
+def doodle_batch_step(backend):
+
+    simulation = BatchSimulation(BATCH_COUNT, seed=SEED)
+    rng = np.random.default_rng(SEED)
+
+    return lambda: simulation.step(rng.choice(doodle_sim.ACTIONS, BATCH_COUNT)), BATCH_COUNT
+
+def doodle_best_action(backend):
+
+    policy = doodle_sim.Policy(backend=backend, seed=SEED)
+    simulation = doodle_sim.Simulation(seed=SEED)
+    state = simulation.get_state()
+
+    return lambda: policy.best_action(state), 1
+
+def doodle_update(backend):
+
+    policy = doodle_sim.Policy(backend=backend, seed=SEED)
+    rng = random.Random(SEED)
+
+    def update():
+        previous_state = [ rng.uniform(0, doodle_sim.VIEWPORT_WIDTH) for _ in range(2) ]
+        state = [ rng.uniform(0, doodle_sim.VIEWPORT_WIDTH) for _ in range(2) ]
+        policy.best_action(previous_state)
+        policy.update(previous_state, state, rng.choice(doodle_sim.ACTIONS), -10)
+
+    return update, 1
+
+def doodle_train(backend):
+    # Un partial_fit sur un lot tiré d'un tampon déjà rempli : fits par seconde
+
+    policy = doodle_sim.Policy(backend=backend, seed=SEED)
+    rng = np.random.default_rng(SEED)
+
+    policy.replay_buffer.add_batch(rng.uniform(0, doodle_sim.VIEWPORT_WIDTH, (REPLAY_FILL, 2)),
+                                   rng.integers(0, len(doodle_sim.ACTIONS), REPLAY_FILL),
+                                   rng.choice([ -10, 100 ], REPLAY_FILL),
+                                   rng.uniform(0, doodle_sim.VIEWPORT_WIDTH, (REPLAY_FILL, 2)),
+                                   rng.random(REPLAY_FILL) < 0.01)
+
+    return policy.train, 1
+
+def maze_apply(backend):
+
+    environment = maze_sim.Environment(maze_sim.MAZE)
+    states = list(environment.states)
+    rng = random.Random(SEED)
+
+    return lambda: environment.apply(rng.choice(states), rng.choice(maze_sim.ACTIONS)), 1
+
+def maze_apply_batch(backend):
+
+    environment = maze_sim.Environment(maze_sim.MAZE)
+    rng = np.random.default_rng(SEED)
+    state_ids = rng.integers(0, environment.tiles.size, BATCH_COUNT)
+    action_ids = rng.integers(0, len(maze_sim.ACTIONS), BATCH_COUNT)
+
+    return lambda: environment.apply_batch(state_ids, action_ids), BATCH_COUNT
+
+def maze_policy(backend):
+    # Petit pas d'apprentissage : avec DEFAULT_LEARNING_RATE, SGD diverge sur ces données
+    environment = maze_sim.Environment(maze_sim.MAZE)
+    return environment, maze_sim.Policy(maze_sim.ACTIONS, environment.width, environment.height,
+                                        learning_rate=0.01, backend=backend, seed=SEED)
+
+def maze_best_action(backend):
+
+    environment, policy = maze_policy(backend)
+    state = environment.starting_point
+
+    return lambda: policy.best_action(state), 1
+
+def maze_update(backend):
+
+    environment, policy = maze_policy(backend)
+    states = list(environment.states)
+    rng = random.Random(SEED)
+
+    def update():
+        previous_state = rng.choice(states)
+        action = policy.best_action(previous_state)
+        state, reward = environment.apply(previous_state, action)
+        policy.update(previous_state, state, action, reward)
+
+    return update, 1
+
+def maze_train(backend):
+
+    environment, policy = maze_policy(backend)
+    rng = np.random.default_rng(SEED)
+    states = np.array(list(environment.states))
+
+    policy.replay_buffer.add_batch(states[rng.integers(0, len(states), REPLAY_FILL)],
+                                   rng.integers(0, len(maze_sim.ACTIONS), REPLAY_FILL),
+                                   rng.integers(-10, 1, REPLAY_FILL),
+                                   states[rng.integers(0, len(states), REPLAY_FILL)],
+                                   rng.random(REPLAY_FILL) < 0.01)
+
+    return policy.train, 1
+
+BENCHMARKS = [
+    # (nom, fabrique, dépend du backend)
+    ("doodle.tick", doodle_tick, False),
+    ("doodle.step", doodle_step, False),
+    ("doodle.batch_step", doodle_batch_step, False),
+    ("doodle.best_action", doodle_best_action, True),
+    ("doodle.update", doodle_update, True),
+    ("doodle.train", doodle_train, True),
+    ("maze.apply", maze_apply, False),
+    ("maze.apply_batch", maze_apply_batch, False),
+    ("maze.best_action", maze_best_action, True),
+    ("maze.update", maze_update, True),
+    ("maze.train", maze_train, True),
+]
+
+# Modules chronométrés à l'import, chacun dans un interpréteur neuf, et les dépendances lourdes
+# qu'ils ont le droit de charger : le code sans fenêtre ne doit toucher ni arcade ni sklearn
+IMPORTS = [
+    ("doodle_sim", ()),
+    ("maze_sim", ()),
+    ("doodle_batch", ()),
+    ("evaluate", ()),
+    ("rollout", ()),
+    ("recording", ()),
+    ("sweep", ()),
+    ("doodle_window", ("arcade",)),
+]
+HEAVY_MODULES = ("arcade", "sklearn", "pyglet")
+
+# Mémoire lue dans /proc (VmHWM, pic de RSS en KiB) : ru_maxrss garde le pic du processus
+# parent à travers fork, il ne mesure pas l'import. 0 hors Linux.
+IMPORT_PROBE = """
+import importlib, json, os, sys, time
+def peak():
+    if not os.path.exists("/proc/self/status"):
+        return 0
+    with open("/proc/self/status") as f:
+        return next((int(line.split()[1]) for line in f if line.startswith("VmHWM")), 0)
+before = peak()
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({ "seconds": seconds, "kib": peak() - before,
+                   "loaded": [ name for name in sys.argv[2:] if name in sys.modules ] }))
+"""
+
+def measure_import(module, allowed, iterations=IMPORT_ITERATIONS):
+    # None si le module ne s'importe pas ici (arcade absent pour doodle_window)
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+
+    for _ in range(iterations):
+        process = subprocess.run([ sys.executable, "-c", IMPORT_PROBE, module, *HEAVY_MODULES ],
+                                 cwd=directory, capture_output=True, text=True)
+        if process.returncode != 0:
+            return None
+        samples.append(json.loads(process.stdout))
+
+    seconds = np.array([ sample["seconds"] for sample in samples ])
+
+    return {
+        "rate": 1 / seconds.mean(),
+        "p50_us": float(np.percentile(seconds, 50)) * 1e6,
+        "p99_us": float(np.percentile(seconds, 99)) * 1e6,
+        "peak_kib": float(max(sample["kib"] for sample in samples)),
+        "heavy": [ name for name in samples[0]["loaded"] if name not in allowed ],
+    }
+
+def measure(factory, backend, iterations):
+
+    function, items = factory(backend)
+
+    for _ in range(WARMUP):
+        function()
+
+    latencies = np.zeros(iterations, dtype=np.int64)
+    clock = time.perf_counter_ns
+
+    for i in range(iterations):
+        start = clock()
+        function()
+        latencies[i] = clock() - start
+
+    # Mémoire mesurée à part : tracemalloc ralentit fortement les appels
+    tracemalloc.start()
+    function, _ = factory(backend)
+    for _ in range(min(iterations, MEMORY_ITERATIONS)):
+        function()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "rate": items * iterations / (latencies.sum() / 1e9),
+        "p50_us": float(np.percentile(latencies, 50)) / 1e3,
+        "p99_us": float(np.percentile(latencies, 99)) / 1e3,
+        "peak_kib": peak / 1024,
+    }
+
+def run(selection=None, iterations=ITERATIONS):
+
+    results = {}
+
+    for name, factory, per_backend in BENCHMARKS:
+
+        for backend in (BACKENDS if per_backend else [ None ]):
+
+            key = name if backend is None else f"{name}[{backend}]"
+            if selection and selection not in key:
+                continue
+
+            results[key] = measure(factory, backend, iterations)
+
+    for module, allowed in IMPORTS:
+
+        key = f"import.{module}"
+        if selection and selection not in key:
+            continue
+
+        result = measure_import(module, allowed)
+        if result is not None:
+            results[key] = result
+
+    return results
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    # Renvoie les benchmarks dont le débit a baissé de plus de tolerance, et les imports
+    # qui chargent une dépendance lourde qu'ils ne devraient pas charger
+
+    regressions = []
+
+    for key, result in results.items():
+        if key in baseline and result["rate"] < baseline[key]["rate"] * (1 - tolerance):
+            regressions.append(key)
+        elif result.get("heavy"):
+            regressions.append(f"{key} ({', '.join(result['heavy'])})")
+
+    return regressions
+
+def print_results(results, baseline=None):
+
+    print(f"{'benchmark':32} {'per sec':>12} {'p50 us':>10} {'p99 us':>10} {'peak KiB':>10}"
+          + ("   vs baseline" if baseline else ""))
+
+    for key, result in results.items():
+        line = (f"{key:32} {result['rate']:12.0f} {result['p50_us']:10.1f} "
+                f"{result['p99_us']:10.1f} {result['peak_kib']:10.1f}")
+        if baseline and key in baseline:
+            line += f"   x{result['rate'] / baseline[key]['rate']:.2f}"
+        if result.get("heavy"):
+            line += "   loads " + ", ".join(result["heavy"])
+        print(line)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filter", default=None, help="ne lancer que les benchmarks contenant ce texte")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--save", metavar="PATH", help="enregistrer les résultats comme référence")
+    parser.add_argument("--compare", metavar="PATH", help="comparer à une référence enregistrée")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+
+    results = run(args.filter, args.iterations)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    regressions = compare(results, baseline or {}, args.tolerance)
+    if regressions:
+        print("Regressions: " + ", ".join(regressions))
+        sys.exit(1)
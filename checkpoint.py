@@ -0,0 +1,117 @@
+import json
+import os
+import numpy as np
+
+CHECKPOINT_EVERY = 10000
+
+def optimizer_state(mlp):
+    # (premiers moments ou vitesses, seconds moments, nombre de pas) de l'optimiseur,
+    # pour un QNetwork ou pour l'optimiseur interne d'un MLPRegressor
+
+    if hasattr(mlp, "first_moments"):
+        return mlp.first_moments, mlp.second_moments, mlp.t
+
+    optimizer = mlp._optimizer
+
+    if hasattr(optimizer, "ms"):
+        return optimizer.ms, optimizer.vs, optimizer.t
+
+    return optimizer.velocities, [], 0
+
+def set_optimizer_t(mlp, t):
+
+    if hasattr(mlp, "first_moments"):
+        mlp.t = t
+    elif hasattr(mlp._optimizer, "ms"):
+        mlp._optimizer.t = t
+
+def save_checkpoint(path, policy, counters=None):
+    # Un seul .npz non compressé : poids, état de l'optimiseur, tampon de rejeu et compteurs.
+    # Les paramètres sont rangés comme coefs_ + intercepts_, dans le même ordre pour les deux
+    # backends : un checkpoint sklearn peut être rechargé dans un QNetwork et inversement.
+
+    mlp = policy.mlp
+    arrays = {}
+
+    for i, p in enumerate(mlp.coefs_ + mlp.intercepts_):
+        arrays[f"param_{i}"] = p
+
+    first, second, t = optimizer_state(mlp)
+    for i, m in enumerate(first):
+        arrays[f"optimizer_first_{i}"] = m
+    for i, v in enumerate(second):
+        arrays[f"optimizer_second_{i}"] = v
+    arrays["optimizer_t"] = np.array(t)
+
+    # Transitions de la plus ancienne à la plus récente : un tampon plein commence à position
+    buffer = policy.replay_buffer
+    shift = -buffer.position if buffer.size == buffer.capacity else 0
+    arrays["replay_states"] = np.roll(buffer.states[:buffer.size], shift, axis=0)
+    arrays["replay_actions"] = np.roll(buffer.actions[:buffer.size], shift, axis=0)
+    arrays["replay_rewards"] = np.roll(buffer.rewards[:buffer.size], shift, axis=0)
+    arrays["replay_next_states"] = np.roll(buffer.next_states[:buffer.size], shift, axis=0)
+    arrays["replay_dones"] = np.roll(buffer.dones[:buffer.size], shift, axis=0)
+    arrays["replay_random"] = np.array(json.dumps(buffer.random.bit_generator.state))
+
+    arrays["policy_steps"] = np.array(policy.steps)
+
+    for name, value in (counters or {}).items():
+        arrays[f"counter_{name}"] = np.array(value)
+
+    # Écriture dans un fichier temporaire puis renommage : jamais de checkpoint à moitié écrit
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temporary, path)
+
+def checkpoint_inputs(path):
+    # Taille de l'état attendu par le réseau d'un checkpoint, sans le charger dans une policy
+    with np.load(path) as checkpoint:
+        return checkpoint["param_0"].shape[0]
+
+def load_checkpoint(path, policy, inference_only=False):
+    # Recharge un checkpoint dans policy et renvoie ses compteurs.
+    # Avec inference_only, seuls les poids sont lus et la policy est figée.
+
+    with np.load(path) as checkpoint:
+
+        mlp = policy.mlp
+
+        # set_weights invalide aussi le cache d'inférence de la policy
+        policy.set_weights([ checkpoint[f"param_{i}"]
+                             for i in range(len(mlp.coefs_ + mlp.intercepts_)) ])
+
+        counters = {
+            name[len("counter_"):]: checkpoint[name].item()
+            for name in checkpoint.files if name.startswith("counter_")
+        }
+
+        if inference_only:
+            policy.frozen = True
+            return counters
+
+        first, second, _t = optimizer_state(mlp)
+        for i, m in enumerate(first):
+            if f"optimizer_first_{i}" in checkpoint:
+                m[...] = checkpoint[f"optimizer_first_{i}"]
+        for i, v in enumerate(second):
+            if f"optimizer_second_{i}" in checkpoint:
+                v[...] = checkpoint[f"optimizer_second_{i}"]
+        set_optimizer_t(mlp, checkpoint["optimizer_t"].item())
+
+        # Les size plus récentes, rangées comme si elles venaient d'être ajoutées dans l'ordre
+        buffer = policy.replay_buffer
+        size = min(len(checkpoint["replay_actions"]), buffer.capacity)
+        buffer.states[:size] = checkpoint["replay_states"][-size:]
+        buffer.actions[:size] = checkpoint["replay_actions"][-size:]
+        buffer.rewards[:size] = checkpoint["replay_rewards"][-size:]
+        buffer.next_states[:size] = checkpoint["replay_next_states"][-size:]
+        buffer.dones[:size] = checkpoint["replay_dones"][-size:]
+        buffer.size = size
+        buffer.position = size % buffer.capacity
+
+        buffer.random.bit_generator.state = json.loads(checkpoint["replay_random"].item())
+
+        policy.steps = checkpoint["policy_steps"].item()
+
+    return counters
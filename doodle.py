@@ -1,387 +1,163 @@
-import random
+import argparse
 import time
-import arcade
-import numpy as np
-from sklearn.neural_network import MLPRegressor
-
-X = 0
-Y = 1
-
-GAME_WIDTH = 600
-GAME_HEIGHT = 30000
-
-VIEWPORT_WIDTH = 800
-VIEWPORT_HEIGHT = 1000
-
-PLATFORM_WIDTH = 50
-
-MOVE_X = 10
-MOVE_Y = 20
-
-MAX_JUMP_HEIGHT = 250
-
-GRAVITY = 0.60
-
-ACTION_NOTHING = 0
-ACTION_GOING_LEFT = 1
-ACTION_GOING_RIGHT = 2
-ACTIONS = [ ACTION_NOTHING, ACTION_GOING_LEFT, ACTION_GOING_RIGHT ]
-
-LEARNING_RATE = 1
-DISCOUNT_FACTOR = 0.5
-DECISION_TIMEOUT = 0.1
-
-DEFAULT_REWARD = -10
-NEXT_PLATFORM_REWARD = 50
-DEAD_REWARD = -50
-
-def load_texture_pair(filename):
-    return [
-        arcade.load_texture(filename),
-        arcade.load_texture(filename, flipped_horizontally=True)
-    ]
-
-class Game(arcade.Window):
-
-    def __init__(self, agent, environment):
-
-        super().__init__(VIEWPORT_WIDTH, VIEWPORT_HEIGHT, "Doodle Jump")
-
-        self.environment = environment
-        self.agent = agent
-
-        self.decision_timeout = 0
-        self.current_action = ACTION_NOTHING
-
-        self.dead = False
-        self.new_platform = False
-
-        self.background = arcade.load_texture("resources/bck.png")
-
-    def setup(self):
-
-        self.environment.reset()
-        self.dead = False
-        self.current_platform_index = 0
-
-        self.last_height = self.environment.current_height
-
-        self.physics_engine = arcade.PhysicsEnginePlatformer(self.environment.player,
-                                                             arcade.SpriteList(
-                                                                 use_spatial_hash=True),
-                                                             GRAVITY)
-        self.physics_engine.disable_multi_jump()
-
-        arcade.set_viewport(
-                    0,
-                    VIEWPORT_WIDTH,
-                    0,
-                    VIEWPORT_HEIGHT
-                )
-
-    def on_draw(self):
-
-        # Clear the screen to the background color
-        arcade.start_render()
-
-        (left, _right, bottom, _top) = arcade.get_viewport()
-
-        arcade.draw_lrwh_rectangle_textured(left, bottom,
-                                    VIEWPORT_WIDTH, VIEWPORT_HEIGHT,
-                                    self.background)
-
-        # Draw our sprites
-        self.environment.platforms.draw()
-        self.environment.player.draw()
-
-    def set_effective_platforms(self):
-
-        effective_platforms = arcade.SpriteList(use_spatial_hash=True)
-
-        for platform in self.environment.platforms:
-
-            if platform.top <= self.environment.player.bottom:
-
-                effective_platforms.append(platform)
-
-        self.physics_engine.platforms = effective_platforms
-
-    def move_left(self):
-        
-        self.environment.player.change_x = -MOVE_X
-        self.environment.player.set_texture(0)
-
-    def move_right(self):
-        
-        self.environment.player.change_x = MOVE_X
-        self.environment.player.set_texture(1)
-
-    def scroll_viewport(self):
-
-        (_left, _right, bottom, top) = arcade.get_viewport()
-
-        new_bottom = bottom
-        new_top = top
-
-        must_scroll = False
-
-        if bottom < self.environment.current_height:
-            new_bottom = bottom + 10
-            must_scroll = True
-        
-        if new_top < VIEWPORT_HEIGHT + self.environment.current_height:
-            new_top = top + 10
-            must_scroll = True
-
-        if must_scroll:
-            arcade.set_viewport(
-                    0,
-                    VIEWPORT_WIDTH,
-                    new_bottom,
-                    new_top
-                )
-
-    def update_game (self):
-
-        self.set_effective_platforms()
-
-        if self.current_action == ACTION_GOING_LEFT:
-            self.move_left()
-        elif self.current_action == ACTION_GOING_RIGHT:
-            self.move_right()
-        else:
-            self.environment.player.change_x = 0
-
-        if self.environment.player.change_y <= 0.0:
-
-            if self.physics_engine.can_jump():
-
-                for i, platform in enumerate(self.environment.platforms):
-
-                    if platform.top < self.environment.player.bottom and i >= self.current_platform_index :
-
-                        if self.current_platform_index != i:
-                            self.current_platform_index = i
-                            self.environment.current_height = self.environment.platforms[self.current_platform_index].bottom
-                            self.new_platform = True
-
-                        self.physics_engine.jump(MOVE_Y)
-
-        self.physics_engine.update()
-
-        if self.environment.player.top <= self.environment.current_height:
-            self.dead = True
-            self.setup()
-
-        if self.environment.player.right < 0:
-            self.environment.player.left = VIEWPORT_WIDTH
-        elif self.environment.player.left > VIEWPORT_WIDTH:
-            self.environment.player.right = 0
-        
-        self.scroll_viewport()
-
-    def get_reward (self):
-
-        if self.dead:
-            return DEAD_REWARD
-        elif self.new_platform:
-            return NEXT_PLATFORM_REWARD
-
-        print(self.current_platform_index)
-
-        state = self.environment.get_state(self.environment.platforms[self.current_platform_index + 1])
-        
-        player_x = state[0]
-        next_platform_x = state[1]
-
-        distance =  player_x - next_platform_x if player_x >= next_platform_x else next_platform_x - player_x
-
-        percentage = -(abs((distance / VIEWPORT_WIDTH) * 100) // 2)
-
-        return percentage
-
-
-    def on_update(self, delta_time):
-
-        self.decision_timeout += delta_time
-        decide = False
-
-        if self.decision_timeout >= DECISION_TIMEOUT:
-            self.decision_timeout = 0
-            decide = True
-            self.current_action = self.agent.best_action()
-
-        self.update_game()
-
-        if decide:
-
-            reward = self.get_reward()
-
-            self.agent.learn(
-                self.current_action, 
-                self.environment.get_state(self.environment.platforms[self.current_platform_index]), 
-                reward)
-
-            self.dead = False
-            self.new_platform = False
-
-class Agent:
-
-    def __init__(self, environment):
-
-        self.environment = environment
-        self.policy = Policy()
-        self.reset()
-
-    def reset(self):
-        self.state = self.environment.get_state(self.environment.platforms[0])
-        self.score = 0
-
-    def best_action (self):
-        return self.policy.best_action(self.state)
-
-    def learn(self, action, new_state, reward):
-        previous_state = self.state
-        self.policy.update(previous_state, new_state, action, reward)
-        self.state = new_state
-        self.score += reward
-
-class Policy: #ANN
-    def __init__(self):
-        
-        self.learning_rate = LEARNING_RATE
-        self.discount_factor = DISCOUNT_FACTOR
-        self.actions = ACTIONS
-        self.maxX = VIEWPORT_WIDTH
-        self.maxY = VIEWPORT_HEIGHT
-
-        self.mlp = MLPRegressor(hidden_layer_sizes = (2,),
-                                activation = 'tanh',
-                                solver = 'adam',
-                                learning_rate_init = self.learning_rate,
-                                max_iter = 1,
-                                warm_start = True)
-        self.mlp.fit([[0, 0]], [[0, 0, 0]])
-        self.q_vector = [ 0, 0, 0 ]
-
-    def __repr__(self):
-        return self.q_vector
-
-    def state_to_dataset(self, state):
-
-        return np.array([
-            [
-                #state[0][0] / self.maxX, state[0][1] / self.maxY,
-                #state[1][0] / self.maxX, state[1][1] / self.maxY
-                state[0] / self.maxX,
-                state[1] / self.maxX
-            ]
-        ])
-
-    def best_action(self, state):
-        dataset = self.state_to_dataset(state)
-        self.q_vector = self.mlp.predict(dataset)[0] #Vérifier que state soit au bon format
-        action = self.actions[np.argmax(self.q_vector)]
-        return action
-
-    def update(self, previous_state, state, last_action, reward):
-        #Q(st, at) = Q(st, at) + learning_rate * (reward + discount_factor * max(Q(state)) - Q(st, at))
-        maxQ = np.amax(self.q_vector)
-        self.q_vector[last_action] += reward + self.discount_factor * maxQ
-        #self.q_vector[last_action] = reward
-        inputs = self.state_to_dataset(previous_state)
-        outputs = np.array([self.q_vector])
-        self.mlp.fit(inputs, outputs)
-
-
-class Environment:
-
-    def __init__(self):
-
-        self.level_platforms_coordinates = self.generate_platforms_coordinates()
-        self.reset()
-
-    def reset (self):
-        self.setup_platforms()
-        self.setup_player()
-        self.current_height = 0
-
-    def get_state(self, next_platform):
-        
-        return [
-            #(self.player.center_x, self.player.center_y),
-            #self.get_next_platform_coordinates()
-            self.player.center_x,
-            next_platform.center_x
-        ]
-
-    def setup_platforms(self):
-
-        self.platforms = arcade.SpriteList(use_spatial_hash=True)
-
-        for coordinates in self.level_platforms_coordinates:
-
-            sprite = arcade.Sprite("resources/platform.png", 1)
-
-            sprite.center_x = coordinates[X]
-            sprite.center_y = coordinates[Y]
-
-            self.platforms.append(sprite)
-
-    def setup_player(self):
-        
-        first_platform = self.platforms[0]
-
-        filename = "resources/doodle_left.png"
-
-        self.player = arcade.Sprite(scale=0.5)
-        for t in load_texture_pair(filename):
-            self.player.append_texture(t)
-        
-        self.player.set_texture(0)
-        self.player.center_x = first_platform.center_x
-        self.player.bottom = first_platform.bottom + first_platform.height
-
-
-    def generate_platforms_coordinates(self):
-
-        current_height = 50
-
-        coordinates = [
-            ((GAME_WIDTH / 2), current_height)
-        ]
-
-        min_decay = 30
-        max_decay = 60
-
-        while current_height <= GAME_HEIGHT:
-
-            x = random.randint(
-                0,
-                GAME_WIDTH - PLATFORM_WIDTH
-            )
-            y = random.randint(
-                current_height + min_decay,
-                current_height + MAX_JUMP_HEIGHT
-            )
-
-            if random.choice([ True, False ]):
-                if min_decay < max_decay:
-                    min_decay += 1
-
-            current_height = y
-            c = (x, y)
-
-            coordinates.append(c)
-
-        return coordinates
-
+from doodle_sim import (
+    ACTIONS,
+    Simulation, Snapshot, StateFeatures, Agent, Policy,
+    train, train_step
+)
+from checkpoint import CHECKPOINT_EVERY, save_checkpoint, load_checkpoint, checkpoint_inputs
+from trainer import BackgroundTrainer
+from profiling import PROFILER
+from metrics import TrainingMetrics
+from level_bank import LevelBank
+from games import GAME_DOODLE
+from recording import EpisodeRecorder, Recording, ReplayAgent
+
+# Options sans effet sur un épisode rejoué
+REPLAY_CONFLICTS = [
+    "seed", "infinite", "bank", "level", "features", "headless", "checkpoint", "resume",
+    "inference", "cache_bins", "background", "metrics", "record", "record_q",
+]
+
+# Options remplacées par le niveau lu dans la banque
+BANK_CONFLICTS = [ "seed", "infinite" ]
+
+def run_window(*args):
+    # arcade n'est importé qu'ici : --headless et --help n'initialisent pas OpenGL
+    import arcade
+    from doodle_window import Game
+
+    window = Game(*args)
+    window.setup()
+    arcade.run()
 
 if __name__ == "__main__":
 
-    environment = Environment()
-    agent = Agent(environment)
-
-    window = Game(agent, environment)
-    window.setup()
-    arcade.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--infinite", action="store_true",
+                        help="niveau sans fin généré au fur et à mesure à partir de --seed")
+    parser.add_argument("--bank", metavar="DIR", default=None,
+                        help="jouer un niveau d'une banque pré-générée (level_bank.py)")
+    parser.add_argument("--level", type=int, default=0, help="niveau de la banque à jouer")
+    parser.add_argument("--features", type=int, metavar="K", default=None,
+                        help="état enrichi : position, vitesse et K plateformes suivantes")
+    parser.add_argument("--speed", type=float, default=1,
+                        help="ticks de simulation par tick d'affichage")
+    parser.add_argument("--headless", type=int, metavar="STEPS", default=None,
+                        help="entraîner STEPS décisions sans fenêtre, aussi vite que possible")
+    parser.add_argument("--checkpoint", metavar="PATH", default=None,
+                        help=f"sauvegarder l'entraînement tous les {CHECKPOINT_EVERY} pas")
+    parser.add_argument("--resume", metavar="PATH", default=None,
+                        help="reprendre l'entraînement depuis un checkpoint")
+    parser.add_argument("--inference", metavar="PATH", default=None,
+                        help="jouer avec les poids d'un checkpoint, sans apprendre")
+    parser.add_argument("--cache-bins", type=int, default=None, metavar="BINS",
+                        help="avec --inference, lire les Q dans une grille précalculée de BINS x BINS états")
+    parser.add_argument("--background", action="store_true",
+                        help="entraîner dans un thread à pleine vitesse, la fenêtre suit")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="chronométrer les étapes, rapport périodique sur stderr et bilan dans PATH")
+    parser.add_argument("--metrics", metavar="DIR", default=None,
+                        help="journaliser chaque décision et chaque épisode dans DIR")
+    parser.add_argument("--record", metavar="DIR", default=None,
+                        help="enregistrer chaque épisode dans DIR, pour le rejouer avec --replay")
+    parser.add_argument("--record-q", action="store_true",
+                        help="garder aussi les Q-vecteurs dans les enregistrements")
+    parser.add_argument("--replay", metavar="PATH", default=None,
+                        help="rejouer un épisode enregistré, sans Policy, à --speed")
+    parser.add_argument("--profile-every", type=int, default=None, metavar="STEPS")
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        PROFILER.enable(args.profile_every)
+
+    if args.replay is not None:
+        # L'enregistrement fixe le niveau et les actions : ni Simulation à configurer,
+        # ni Policy, ni checkpoint
+        ignored = [ name for name in REPLAY_CONFLICTS
+                    if getattr(args, name) != parser.get_default(name) ]
+        if ignored:
+            parser.error("--replay cannot be combined with "
+                         + ", ".join("--" + name.replace("_", "-") for name in ignored))
+
+        recording = Recording.load(args.replay)
+        simulation = recording.environment()
+        run_window(ReplayAgent(recording, simulation), simulation, args.speed)
+        if args.profile is not None:
+            PROFILER.export(args.profile)
+        raise SystemExit
+
+    if args.bank is not None:
+        ignored = [ name for name in BANK_CONFLICTS
+                    if getattr(args, name) != parser.get_default(name) ]
+        if ignored:
+            parser.error("--bank cannot be combined with "
+                         + ", ".join("--" + name for name in ignored))
+    elif args.level != parser.get_default("level"):
+        parser.error("--level requires --bank")
+
+    features = None
+    if args.features is not None:
+        features = StateFeatures(args.features)
+        if args.cache_bins is not None:
+            parser.error("--cache-bins only covers the two-coordinate state, not --features")
+
+    state_size = 2 if features is None else features.size
+    for path in (args.resume, args.inference):
+        if path is not None and checkpoint_inputs(path) != state_size:
+            parser.error(f"{path} expects states of {checkpoint_inputs(path)} values, "
+                         f"not {state_size} (check --features)")
+
+    if args.bank is not None:
+        simulation = LevelBank.open(args.bank).simulation(args.level, features=features)
+    else:
+        simulation = Simulation(seed=args.seed, infinite=args.infinite, features=features)
+    agent = Agent(simulation, Policy(seed=args.seed, features=features))
+
+    if args.resume is not None:
+        agent.restore(load_checkpoint(args.resume, agent.policy))
+    elif args.inference is not None:
+        load_checkpoint(args.inference, agent.policy, inference_only=True)
+        if args.cache_bins is not None:
+            agent.policy.freeze(args.cache_bins)
+
+    checkpoint_path = args.checkpoint
+    if checkpoint_path is None and args.inference is None:
+        checkpoint_path = args.resume
+
+    recorder = None
+    if args.record is not None:
+        recorder = EpisodeRecorder(GAME_DOODLE, simulation, directory=args.record,
+                                   q_vectors=args.record_q)
+
+    metrics = None
+    if args.metrics is not None:
+        metrics = TrainingMetrics(args.metrics, len(ACTIONS),
+                                  step=agent.policy.steps, episode=agent.episodes)
+
+    if args.headless is not None:
+        start = time.perf_counter()
+        train(simulation, agent, args.headless, checkpoint_path, metrics=metrics,
+              recorder=recorder)
+        print(f"{args.headless} steps in {time.perf_counter() - start:.2f}s, "
+              f"score {agent.score}")
+        if args.profile is not None:
+            PROFILER.export(args.profile)
+    else:
+        trainer = None
+        if args.background:
+
+            def step():
+                train_step(simulation, agent, metrics, recorder)
+                if (checkpoint_path is not None and not agent.policy.frozen
+                        and agent.policy.steps % CHECKPOINT_EVERY == 0):
+                    save_checkpoint(checkpoint_path, agent.policy, agent.counters())
+
+            trainer = BackgroundTrainer(step, lambda: Snapshot(simulation))
+
+        run_window(agent, simulation, args.speed, checkpoint_path, trainer, metrics, recorder)
+        if args.profile is not None:
+            PROFILER.export(args.profile)
+        if trainer is not None and trainer.failed:
+            raise SystemExit(1)
@@ -0,0 +1,246 @@
+import random
+import time
+import numpy as np
+from doodle_sim import (
+    X, Y,
+    VIEWPORT_WIDTH,
+    PLATFORM_SPRITE_WIDTH, PLATFORM_SPRITE_HEIGHT,
+    PLAYER_SPRITE_WIDTH, PLAYER_SPRITE_HEIGHT,
+    MOVE_X, MOVE_Y,
+    GRAVITY, JUMP_TOLERANCE,
+    ACTION_GOING_LEFT, ACTION_GOING_RIGHT, ACTIONS,
+    TICKS_PER_DECISION,
+    NEXT_PLATFORM_REWARD, DEAD_REWARD,
+    generate_platforms_coordinates
+)
+
+def jump_reach():
+    # Hauteur maximale gagnée par un saut de MOVE_Y
+
+    change_y = MOVE_Y
+    height = 0
+
+    while change_y > 0:
+        change_y -= GRAVITY
+        height += max(change_y, 0)
+
+    return height
+
+class BatchSimulation:
+    # N parties de Simulation avancées ensemble : une ligne des tableaux par partie.
+    # Les niveaux sont complétés avec des plateformes à l'infini, jamais atteignables.
+    # Chaque tick ne regarde qu'une fenêtre de plateformes autour de la plateforme courante,
+    # précalculée par bisection sur les hauteurs : le coût ne dépend pas de la taille du niveau.
+
+    def __init__(self, count, levels=None, ticks_per_decision=TICKS_PER_DECISION, seed=None):
+
+        if levels is None:
+            rng = random.Random(seed)
+            levels = [ generate_platforms_coordinates(rng) for _ in range(count) ]
+
+        self.count = count
+        self.ticks_per_decision = ticks_per_decision
+        self.rows = np.arange(count)
+
+        self.platforms_count = np.array([ len(level) for level in levels ])
+        size = self.platforms_count.max()
+
+        self.platforms_x = np.full((count, size), np.inf)
+        self.platforms_y = np.full((count, size), np.inf)
+
+        for i, level in enumerate(levels):
+            coordinates = np.asarray(level, dtype=float)
+            coordinates = coordinates[np.argsort(coordinates[:, Y], kind="stable")]
+            self.platforms_x[i, :len(level)] = coordinates[:, X]
+            self.platforms_y[i, :len(level)] = coordinates[:, Y]
+
+        self.platforms_left = self.platforms_x - PLATFORM_SPRITE_WIDTH / 2
+        self.platforms_right = self.platforms_x + PLATFORM_SPRITE_WIDTH / 2
+        self.platforms_bottom = self.platforms_y - PLATFORM_SPRITE_HEIGHT / 2
+        self.platforms_top = self.platforms_y + PLATFORM_SPRITE_HEIGHT / 2
+
+        self.setup_windows()
+
+        self.center_x = np.zeros(count)
+        self.center_y = np.zeros(count)
+        self.change_y = np.zeros(count)
+        self.texture = np.zeros(count, dtype=np.int8)
+        self.current_height = np.zeros(count)
+        self.current_platform_index = np.zeros(count, dtype=np.intp)
+
+        self.dead = np.zeros(count, dtype=bool)
+        self.new_platform = np.zeros(count, dtype=bool)
+
+        self.reset()
+
+    def setup_windows(self):
+
+        # Un joueur vivant a toujours top > current_height et ne monte pas plus haut que
+        # jump_reach() au-dessus de sa plateforme : tout ce qui est en dessous de la fenêtre
+        # est effectif, tout ce qui est au-dessus est hors d'atteinte.
+        reach = jump_reach()
+
+        self.window_start = np.zeros(self.platforms_top.shape, dtype=np.intp)
+        window_size = 1
+
+        for i in range(self.count):
+            n = self.platforms_count[i]
+            tops = self.platforms_top[i, :n]
+            lowest = self.platforms_bottom[i, :n] - PLAYER_SPRITE_HEIGHT - JUMP_TOLERANCE
+
+            start = np.searchsorted(tops, lowest, side="right")
+            start[0] = 0
+            end = np.searchsorted(tops, tops + reach, side="right")
+
+            self.window_start[i, :n] = start
+            window_size = max(window_size, (end - start).max())
+
+        self.window = np.arange(window_size)
+
+        # Colonnes à l'infini pour que la fenêtre ne sorte jamais des tableaux
+        padding = np.full((self.count, window_size), np.inf)
+        self.platforms_left = np.hstack([ self.platforms_left, padding ])
+        self.platforms_right = np.hstack([ self.platforms_right, padding ])
+        self.platforms_bottom = np.hstack([ self.platforms_bottom, padding ])
+        self.platforms_top = np.hstack([ self.platforms_top, padding ])
+
+    def reset(self, mask=None):
+
+        if mask is None:
+            mask = np.ones(self.count, dtype=bool)
+
+        self.center_x[mask] = self.platforms_x[mask, 0]
+        self.center_y[mask] = self.platforms_top[mask, 0] + PLAYER_SPRITE_HEIGHT / 2
+        self.change_y[mask] = 0
+        self.texture[mask] = 0
+        self.current_height[mask] = 0
+        self.current_platform_index[mask] = 0
+
+        return self.get_states()
+
+    def get_states(self, platforms_index=None):
+
+        if platforms_index is None:
+            platforms_index = self.current_platform_index
+
+        return np.stack([
+            self.center_x,
+            self.platforms_x[self.rows, platforms_index]
+        ], axis=1)
+
+    def update_game(self, actions, active):
+
+        left = self.center_x - PLAYER_SPRITE_WIDTH / 2
+        right = self.center_x + PLAYER_SPRITE_WIDTH / 2
+        bottom = self.center_y - PLAYER_SPRITE_HEIGHT / 2
+        top = self.center_y + PLAYER_SPRITE_HEIGHT / 2
+
+        going_left = actions == ACTION_GOING_LEFT
+        going_right = actions == ACTION_GOING_RIGHT
+
+        change_x = np.where(going_left, -MOVE_X, np.where(going_right, MOVE_X, 0))
+        self.texture[active & going_left] = 0
+        self.texture[active & going_right] = 1
+
+        start = self.window_start[self.rows, self.current_platform_index]
+        columns = start[:, None] + self.window
+
+        platforms_left = np.take_along_axis(self.platforms_left, columns, axis=1)
+        platforms_right = np.take_along_axis(self.platforms_right, columns, axis=1)
+        platforms_bottom = np.take_along_axis(self.platforms_bottom, columns, axis=1)
+        platforms_top = np.take_along_axis(self.platforms_top, columns, axis=1)
+
+        # Plateformes sous les pieds du joueur (set_effective_platforms) et dans son axe x
+        effective = platforms_top <= bottom[:, None]
+        candidates = effective \
+            & (platforms_left < right[:, None]) \
+            & (platforms_right > left[:, None])
+
+        can_jump = (candidates
+            & (platforms_bottom < top[:, None] - JUMP_TOLERANCE)
+            & (platforms_top > bottom[:, None] - JUMP_TOLERANCE)).any(axis=1)
+
+        # Les plateformes sont triées par hauteur : la dernière effective est celle atteinte
+        landing = start + effective.sum(axis=1) - 1
+        jump = active & (self.change_y <= 0.0) & can_jump & (landing >= self.current_platform_index)
+
+        new_platform = jump & (landing != self.current_platform_index)
+        self.current_platform_index[new_platform] = landing[new_platform]
+        self.current_height[new_platform] = self.platforms_bottom[self.rows, landing][new_platform]
+        self.new_platform |= new_platform
+        self.change_y[jump] = MOVE_Y
+
+        change_y = np.where(active, self.change_y - GRAVITY, self.change_y)
+        center_y = np.where(active, self.center_y + change_y, self.center_y)
+        bottom = center_y - PLAYER_SPRITE_HEIGHT / 2
+        top = center_y + PLAYER_SPRITE_HEIGHT / 2
+
+        hits = candidates \
+            & (platforms_bottom < top[:, None]) \
+            & (platforms_top > bottom[:, None])
+        landed = active & hits.any(axis=1)
+
+        highest_top = np.where(hits, platforms_top, -np.inf).max(axis=1)
+        center_y[landed] = highest_top[landed] + PLAYER_SPRITE_HEIGHT / 2
+        change_y[landed] = 0
+
+        self.center_y = center_y
+        self.change_y = change_y
+        self.center_x = np.where(active, self.center_x + change_x, self.center_x)
+
+        dead = active & (self.center_y + PLAYER_SPRITE_HEIGHT / 2 <= self.current_height)
+        if dead.any():
+            self.dead |= dead
+            self.reset(dead)
+
+        left = self.center_x - PLAYER_SPRITE_WIDTH / 2
+        right = self.center_x + PLAYER_SPRITE_WIDTH / 2
+
+        wrap_right = active & (right < 0)
+        wrap_left = active & (left > VIEWPORT_WIDTH)
+        self.center_x[wrap_right] = VIEWPORT_WIDTH + PLAYER_SPRITE_WIDTH / 2
+        self.center_x[wrap_left] = -PLAYER_SPRITE_WIDTH / 2
+
+    def get_rewards(self):
+
+        next_platforms_index = np.minimum(self.current_platform_index + 1, self.platforms_count - 1)
+        states = self.get_states(next_platforms_index)
+
+        distance = np.abs(states[:, 0] - states[:, 1])
+        rewards = -(np.abs((distance / VIEWPORT_WIDTH) * 100) // 2)
+
+        rewards[self.new_platform] = NEXT_PLATFORM_REWARD
+        rewards[self.dead] = DEAD_REWARD
+
+        return rewards
+
+    def step(self, actions):
+
+        actions = np.asarray(actions)
+
+        self.dead[:] = False
+        self.new_platform[:] = False
+
+        for _ in range(self.ticks_per_decision):
+            active = ~self.dead
+            if not active.any():
+                break
+            self.update_game(actions, active)
+
+        rewards = self.get_rewards()
+
+        return self.get_states(), rewards, self.dead.copy()
+
+if __name__ == "__main__":
+
+    count = 256
+    steps = 1000
+
+    environment = BatchSimulation(count)
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        environment.step(np.random.choice(ACTIONS, count))
+    elapsed = time.perf_counter() - start
+
+    print(f"{count * steps} transitions in {elapsed:.2f}s ({count * steps / elapsed:.0f} transitions/s)")
@@ -0,0 +1,729 @@
+import bisect
+import random
+import time
+import numpy as np
+from qnetwork import SKLEARN
+from q_learning import QLearningPolicy
+from checkpoint import CHECKPOINT_EVERY, save_checkpoint
+from profiling import PROFILER, timed
+from qcache import QCache
+
+X = 0
+Y = 1
+
+GAME_WIDTH = 600
+GAME_HEIGHT = 30000
+
+VIEWPORT_WIDTH = 800
+VIEWPORT_HEIGHT = 1000
+
+PLATFORM_WIDTH = 50
+
+# Taille des sprites de resources/ (platform.png, doodle_left.png à l'échelle 0.5)
+PLATFORM_SPRITE_WIDTH = 114
+PLATFORM_SPRITE_HEIGHT = 32
+PLAYER_SPRITE_WIDTH = 145 * 0.5
+PLAYER_SPRITE_HEIGHT = 142 * 0.5
+
+MOVE_X = 10
+MOVE_Y = 20
+
+MAX_JUMP_HEIGHT = 250
+
+GRAVITY = 0.60
+
+# Distance utilisée par arcade.PhysicsEnginePlatformer.can_jump
+JUMP_TOLERANCE = 5
+
+ACTION_NOTHING = 0
+ACTION_GOING_LEFT = 1
+ACTION_GOING_RIGHT = 2
+ACTIONS = [ ACTION_NOTHING, ACTION_GOING_LEFT, ACTION_GOING_RIGHT ]
+
+LEARNING_RATE = 1
+DISCOUNT_FACTOR = 0.5
+DECISION_TIMEOUT = 0.1
+HIDDEN_LAYER_SIZES = (2,)
+
+# Nombre de plateformes suivantes décrites par un StateFeatures
+NEXT_PLATFORMS = 3
+
+# Bornes de l'état (x du joueur, x de la plateforme) et finesse du cache d'inférence
+STATE_LOWS = (-PLAYER_SPRITE_WIDTH / 2, 0)
+STATE_HIGHS = (VIEWPORT_WIDTH + PLAYER_SPRITE_WIDTH / 2, GAME_WIDTH - PLATFORM_WIDTH)
+CACHE_BINS = 256
+
+REPLAY_CAPACITY = 10000
+BATCH_SIZE = 128
+TRAIN_EVERY = 16
+
+Q_BACKEND = SKLEARN
+
+FRAME_RATE = 60
+TICKS_PER_DECISION = round(DECISION_TIMEOUT * FRAME_RATE)
+
+DEFAULT_REWARD = -10
+NEXT_PLATFORM_REWARD = 50
+DEAD_REWARD = -50
+
+# Niveau sans fin : taille des morceaux générés, hauteur générée d'avance au-dessus du joueur
+# et hauteur conservée en dessous
+LEVEL_CHUNK_SIZE = 64
+LEVEL_LOOKAHEAD = 3 * VIEWPORT_HEIGHT
+LEVEL_KEEP_BELOW = 3 * VIEWPORT_HEIGHT
+
+# Hauteur autour de la plateforme courante copiée dans un Snapshot pour l'affichage
+SNAPSHOT_MARGIN = 2 * VIEWPORT_HEIGHT
+
+def platforms_stream(rng=random):
+    # Plateformes du niveau, de bas en haut, sans limite de hauteur
+
+    current_height = 50
+
+    yield ((GAME_WIDTH / 2), current_height)
+
+    min_decay = 30
+    max_decay = 60
+
+    while True:
+
+        x = rng.randint(
+            0,
+            GAME_WIDTH - PLATFORM_WIDTH
+        )
+        y = rng.randint(
+            current_height + min_decay,
+            current_height + MAX_JUMP_HEIGHT
+        )
+
+        if rng.choice([ True, False ]):
+            if min_decay < max_decay:
+                min_decay += 1
+
+        current_height = y
+
+        yield (x, y)
+
+def generate_platforms_coordinates(rng=random):
+
+    coordinates = []
+
+    for c in platforms_stream(rng):
+
+        coordinates.append(c)
+
+        if c[Y] > GAME_HEIGHT:
+            break
+
+    return coordinates
+
+class Player:
+
+    def __init__(self, center_x, bottom):
+
+        self.center_x = center_x
+        self.center_y = bottom + PLAYER_SPRITE_HEIGHT / 2
+        self.change_x = 0
+        self.change_y = 0
+        self.texture = 0
+
+    @property
+    def left(self):
+        return self.center_x - PLAYER_SPRITE_WIDTH / 2
+
+    @left.setter
+    def left(self, value):
+        self.center_x = value + PLAYER_SPRITE_WIDTH / 2
+
+    @property
+    def right(self):
+        return self.center_x + PLAYER_SPRITE_WIDTH / 2
+
+    @right.setter
+    def right(self, value):
+        self.center_x = value - PLAYER_SPRITE_WIDTH / 2
+
+    @property
+    def bottom(self):
+        return self.center_y - PLAYER_SPRITE_HEIGHT / 2
+
+    @bottom.setter
+    def bottom(self, value):
+        self.center_y = value + PLAYER_SPRITE_HEIGHT / 2
+
+    @property
+    def top(self):
+        return self.center_y + PLAYER_SPRITE_HEIGHT / 2
+
+class Platform:
+
+    def __init__(self, center_x, center_y):
+
+        self.center_x = center_x
+        self.center_y = center_y
+        self.left = center_x - PLATFORM_SPRITE_WIDTH / 2
+        self.right = center_x + PLATFORM_SPRITE_WIDTH / 2
+        self.bottom = center_y - PLATFORM_SPRITE_HEIGHT / 2
+        self.top = center_y + PLATFORM_SPRITE_HEIGHT / 2
+
+class PlatformIndex:
+    # Plateformes triées par hauteur : les recherches se font par bisection sur les sommets,
+    # et le nombre de plateformes sous le joueur est suivi par un curseur mis à jour à chaque tick.
+
+    def __init__(self, platforms):
+
+        self.platforms = platforms
+        self.tops = [ platform.top for platform in platforms ]
+        self.cursor = 0
+
+    def __getitem__(self, i):
+        return self.platforms[i]
+
+    def __len__(self):
+        return len(self.platforms)
+
+    def restart(self):
+        self.cursor = 0
+
+    def follow(self, height):
+        pass
+
+    def count_below(self, height):
+        # Nombre de plateformes dont le sommet est <= height (plateformes effectives)
+
+        tops = self.tops
+        cursor = self.cursor
+
+        # Le joueur bouge peu d'un tick à l'autre : le plus souvent le curseur est déjà bon
+        if cursor < len(tops) and tops[cursor] <= height:
+            cursor = bisect.bisect_right(tops, height, cursor)
+        elif cursor > 0 and tops[cursor - 1] > height:
+            cursor = bisect.bisect_right(tops, height, 0, cursor)
+
+        self.cursor = cursor
+
+        return cursor
+
+    def range(self, low, high):
+        # Indices [start, end[ des plateformes dont le sommet est dans ]low, high]
+
+        start = bisect.bisect_right(self.tops, low)
+        end = bisect.bisect_right(self.tops, high, start)
+
+        return start, end
+
+    def between(self, low, high):
+
+        start, end = self.range(low, high)
+
+        return self.platforms[start:end]
+
+class LevelStream(PlatformIndex):
+    # Niveau sans fin : les plateformes sont générées par morceaux à partir de la graine
+    # quand le joueur monte, et celles qui sont loin en dessous sont oubliées.
+    # Les indices restent ceux du niveau complet ; recommencer relance le générateur.
+
+    def __init__(self, seed=None, chunk_size=LEVEL_CHUNK_SIZE):
+
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.restart()
+
+    def restart(self):
+
+        self.generator = platforms_stream(random.Random(self.seed))
+        self.platforms = []
+        self.tops = []
+        self.offset = 0
+        self.cursor = 0
+
+        self.extend()
+
+    def extend(self):
+
+        for _ in range(self.chunk_size):
+            c = next(self.generator)
+            platform = Platform(c[X], c[Y])
+            self.platforms.append(platform)
+            self.tops.append(platform.top)
+
+    def __getitem__(self, i):
+        return self.platforms[i - self.offset]
+
+    def __len__(self):
+        return self.offset + len(self.platforms)
+
+    def follow(self, height):
+
+        while self.tops[-1] < height + LEVEL_LOOKAHEAD:
+            self.extend()
+
+        evicted = bisect.bisect_right(self.tops, height - LEVEL_KEEP_BELOW)
+
+        if evicted >= self.chunk_size:
+            del self.platforms[:evicted]
+            del self.tops[:evicted]
+            self.offset += evicted
+            self.cursor = max(self.cursor - evicted, 0)
+
+    def count_below(self, height):
+        return self.offset + super().count_below(height)
+
+    def range(self, low, high):
+
+        start, end = super().range(low, high)
+
+        return start + self.offset, end + self.offset
+
+    def between(self, low, high):
+
+        start, end = PlatformIndex.range(self, low, high)
+
+        return self.platforms[start:end]
+
+class Snapshot:
+    # Copie de ce qu'il faut pour dessiner une Simulation : le joueur et les plateformes
+    # autour de la hauteur courante, (indice, x, y). Ne partage rien avec la simulation.
+
+    def __init__(self, simulation, margin=SNAPSHOT_MARGIN):
+
+        player = simulation.player
+
+        self.player_x = player.center_x
+        self.player_y = player.center_y
+        self.texture = player.texture
+        self.current_height = simulation.current_height
+        self.current_platform_index = simulation.current_platform_index
+
+        start, end = simulation.platform_index.range(self.current_height - margin,
+                                                     self.current_height + margin)
+        self.platforms = [
+            (i, simulation.platforms[i].center_x, simulation.platforms[i].center_y)
+            for i in range(start, end)
+        ]
+        # Hauteurs triées, pour chercher les plateformes visibles par bisection
+        self.heights = [ y for _i, _x, y in self.platforms ]
+
+class StateFeatures:
+    # État enrichi de taille fixe pour la Policy, à la place de get_state :
+    #   x du joueur, hauteur au-dessus de la plateforme courante, vitesses x et y,
+    #   décalages (dx, dy) du joueur aux next_platforms plateformes suivant la courante,
+    #   et dx le plus court vers la première en passant par les bords (wraparound).
+    # Les coordonnées des plateformes ne sont relues que quand la plateforme courante change ;
+    # à chaque pas seuls le joueur et les différences sont recalculés dans self.buffer.
+
+    def __init__(self, next_platforms=NEXT_PLATFORMS, wraparound=True):
+
+        self.next_platforms = next_platforms
+        self.wraparound = wraparound
+        self.size = 4 + 2 * next_platforms + (1 if wraparound else 0)
+
+        self.buffer = np.zeros(self.size)
+        self.platforms_xy = np.zeros((next_platforms, 2))
+        self.cached_index = None
+        self.cached_platforms = None
+
+        # Échelles ramenant chaque composante autour de [-1, 1]
+        self.scales = np.ones(self.size)
+        self.scales[0] = VIEWPORT_WIDTH
+        self.scales[1] = MAX_JUMP_HEIGHT
+        self.scales[2] = MOVE_X
+        self.scales[3] = MOVE_Y
+        self.scales[4:4 + 2 * next_platforms:2] = VIEWPORT_WIDTH
+        self.scales[5:4 + 2 * next_platforms:2] = MAX_JUMP_HEIGHT * np.arange(1, next_platforms + 1)
+        if wraparound:
+            self.scales[-1] = VIEWPORT_WIDTH / 2
+
+        # Période horizontale : le joueur sorti à gauche réapparaît à droite
+        self.period = VIEWPORT_WIDTH + PLAYER_SPRITE_WIDTH
+
+    def follow_platforms(self, simulation):
+
+        index = simulation.current_platform_index
+
+        if index == self.cached_index and simulation.platforms is self.cached_platforms:
+            return
+
+        last = len(simulation.platform_index) - 1
+        for k in range(self.next_platforms):
+            # Au sommet d'un niveau fini, on répète la dernière plateforme
+            platform = simulation.platforms[min(index + 1 + k, last)]
+            self.platforms_xy[k, X] = platform.center_x
+            self.platforms_xy[k, Y] = platform.center_y
+
+        self.cached_index = index
+        self.cached_platforms = simulation.platforms
+
+    def extract(self, simulation):
+        # Remplit et renvoie self.buffer : à copier pour le garder au-delà du pas suivant
+
+        self.follow_platforms(simulation)
+
+        player = simulation.player
+        buffer = self.buffer
+        n = self.next_platforms
+
+        buffer[0] = player.center_x
+        buffer[1] = player.bottom - simulation.current_height
+        buffer[2] = player.change_x
+        buffer[3] = player.change_y
+
+        offsets = buffer[4:4 + 2 * n].reshape(n, 2)
+        np.subtract(self.platforms_xy, (player.center_x, player.center_y), out=offsets)
+
+        if self.wraparound:
+            dx = offsets[0, X]
+            buffer[-1] = (dx + self.period / 2) % self.period - self.period / 2
+
+        return buffer
+
+class Simulation:
+    # Moteur de jeu sans fenêtre : même physique que arcade.PhysicsEnginePlatformer
+    # (boîtes englobantes) pour entraîner sans contexte OpenGL.
+
+    def __init__(self, level_platforms_coordinates=None,
+                 ticks_per_decision=TICKS_PER_DECISION, seed=None, infinite=False,
+                 features=None, next_platform_reward=NEXT_PLATFORM_REWARD,
+                 dead_reward=DEAD_REWARD):
+
+        if infinite:
+            # Les plateformes sont lues à travers l'index, qui les génère à la demande
+            self.level_platforms_coordinates = None
+            self.platform_index = LevelStream(seed)
+            self.platforms = self.platform_index
+            seed = self.platform_index.seed
+        else:
+            if level_platforms_coordinates is None:
+                # Graine tirée plutôt que None : le niveau peut être rejoué (recording)
+                if seed is None:
+                    seed = random.randrange(2 ** 32)
+                level_platforms_coordinates = generate_platforms_coordinates(random.Random(seed))
+
+            if isinstance(level_platforms_coordinates, np.ndarray):
+                # Niveau d'une LevelBank : déjà trié, gardé comme vue sur la banque
+                self.level_platforms_coordinates = level_platforms_coordinates
+                coordinates = level_platforms_coordinates.tolist()
+            else:
+                self.level_platforms_coordinates = sorted(level_platforms_coordinates,
+                                                          key=lambda c: c[Y])
+                coordinates = self.level_platforms_coordinates
+
+            self.platforms = [ Platform(c[X], c[Y]) for c in coordinates ]
+            self.platform_index = PlatformIndex(self.platforms)
+
+        self.seed = seed
+        self.ticks_per_decision = ticks_per_decision
+        self.features = features
+        self.next_platform_reward = next_platform_reward
+        self.dead_reward = dead_reward
+
+        self.dead = False
+        self.new_platform = False
+
+        self.reset()
+
+    def reset(self):
+
+        self.platform_index.restart()
+        first_platform = self.platforms[0]
+
+        self.player = Player(first_platform.center_x, first_platform.top)
+        self.current_height = 0
+        self.current_platform_index = 0
+
+        return self.observe()
+
+    def observe(self):
+        # État donné à l'agent : celui des features s'il y en a, sinon get_state()
+
+        if self.features is None:
+            return self.get_state()
+
+        return self.features.extract(self).copy()
+
+    def get_state(self, platform_index=None):
+
+        if platform_index is None:
+            platform_index = self.current_platform_index
+
+        return [
+            self.player.center_x,
+            self.platforms[platform_index].center_x
+        ]
+
+    def colliding_platforms(self, platforms):
+
+        player = self.player
+        left, right = player.left, player.right
+        bottom, top = player.bottom, player.top
+
+        return [
+            platform for platform in platforms
+            if platform.left < right and platform.right > left
+            and platform.bottom < top and platform.top > bottom
+        ]
+
+    def can_jump(self):
+
+        bottom = self.player.bottom
+
+        self.player.center_y -= JUMP_TOLERANCE
+        hit_list = self.colliding_platforms(self.platform_index.between(bottom - JUMP_TOLERANCE, bottom))
+        self.player.center_y += JUMP_TOLERANCE
+
+        return len(hit_list) > 0
+
+    @timed("doodle.physics")
+    def update_physics(self):
+
+        player = self.player
+        bottom = player.bottom
+
+        player.change_y -= GRAVITY
+        player.center_y += player.change_y
+
+        # Seules les plateformes effectives traversées pendant ce tick peuvent arrêter la chute
+        hit_list = self.colliding_platforms(self.platform_index.between(player.bottom, bottom))
+
+        if len(hit_list) > 0:
+            # Les plateformes effectives sont toutes sous le joueur : on ne peut que retomber dessus
+            player.bottom = max(platform.top for platform in hit_list)
+            player.change_y = 0
+
+        player.center_x += player.change_x
+
+    @timed("doodle.update_game")
+    def update_game(self, action):
+
+        player = self.player
+        self.platform_index.follow(player.bottom)
+
+        if action == ACTION_GOING_LEFT:
+            player.change_x = -MOVE_X
+            player.texture = 0
+        elif action == ACTION_GOING_RIGHT:
+            player.change_x = MOVE_X
+            player.texture = 1
+        else:
+            player.change_x = 0
+
+        if player.change_y <= 0.0 and self.can_jump():
+
+            # Dernière plateforme effective : celle sur laquelle le joueur vient d'atterrir
+            landing = self.platform_index.count_below(player.bottom) - 1
+
+            if landing >= self.current_platform_index:
+
+                if self.current_platform_index != landing:
+                    self.current_platform_index = landing
+                    self.current_height = self.platforms[landing].bottom
+                    self.new_platform = True
+                    PROFILER.count("doodle.new_platforms")
+
+                player.change_y = MOVE_Y
+
+        self.update_physics()
+
+        if player.top <= self.current_height:
+            self.dead = True
+            PROFILER.count("doodle.deaths")
+            self.reset()
+            return
+
+        if player.right < 0:
+            player.left = VIEWPORT_WIDTH
+        elif player.left > VIEWPORT_WIDTH:
+            player.right = 0
+
+    def get_reward(self):
+
+        if self.dead:
+            return self.dead_reward
+        elif self.new_platform:
+            return self.next_platform_reward
+
+        next_platform_index = min(self.current_platform_index + 1, len(self.platforms) - 1)
+        state = self.get_state(next_platform_index)
+
+        player_x = state[0]
+        next_platform_x = state[1]
+
+        distance = abs(player_x - next_platform_x)
+
+        return -(abs((distance / VIEWPORT_WIDTH) * 100) // 2)
+
+    def step(self, action):
+
+        self.dead = False
+        self.new_platform = False
+
+        for _ in range(self.ticks_per_decision):
+            self.update_game(action)
+            if self.dead:
+                break
+
+        reward = self.get_reward()
+
+        return self.observe(), reward, self.dead
+
+class Agent:
+
+    def __init__(self, environment, policy=None):
+
+        self.environment = environment
+        self.policy = policy if policy is not None else Policy()
+        self.reset()
+
+    def reset(self):
+        self.state = self.environment.observe()
+        self.score = 0
+        self.episodes = 0
+
+    def best_action (self):
+        return self.policy.best_action(self.state)
+
+    def learn(self, action, new_state, reward, done=False):
+        previous_state = self.state
+        self.policy.update(previous_state, new_state, action, reward, done)
+        self.state = new_state
+        self.score += reward
+        if done:
+            self.episodes += 1
+
+    def counters(self):
+        return { "score": self.score, "episodes": self.episodes }
+
+    def restore(self, counters):
+        self.score = counters.get("score", 0)
+        self.episodes = counters.get("episodes", 0)
+
+class Policy(QLearningPolicy): #ANN
+    def __init__(self,
+                 replay_capacity = REPLAY_CAPACITY,
+                 batch_size = BATCH_SIZE,
+                 train_every = TRAIN_EVERY,
+                 backend = Q_BACKEND,
+                 seed = None,
+                 features = None,
+                 learning_rate = LEARNING_RATE,
+                 discount_factor = DISCOUNT_FACTOR,
+                 hidden_layer_sizes = HIDDEN_LAYER_SIZES):
+
+        self.actions = ACTIONS
+        self.maxX = VIEWPORT_WIDTH
+        self.maxY = VIEWPORT_HEIGHT
+
+        # Même StateFeatures que la Simulation, ou None pour l'état de get_state
+        self.features = features
+        n_inputs = 2 if features is None else features.size
+
+        super().__init__(n_inputs, len(self.actions), 'adam', learning_rate, discount_factor,
+                         replay_capacity, batch_size, train_every, backend, seed,
+                         hidden_layer_sizes)
+        self.q_vector = [ 0, 0, 0 ]
+
+    def freeze(self, bins=CACHE_BINS):
+        # Inférence seule : plus d'apprentissage, et Q précalculé sur une grille de bins x bins
+        # états. best_action devient une lecture dans le cache, au point de grille le plus proche.
+
+        if self.features is not None:
+            raise ValueError("the Q cache only covers the two-coordinate state of get_state")
+
+        self.frozen = True
+        self.q_cache = QCache(self, STATE_LOWS, STATE_HIGHS, (bins, bins))
+
+    def states_to_dataset(self, states):
+
+        states = np.asarray(states, dtype=float)
+
+        if self.features is not None:
+            return states / self.features.scales
+
+        return np.column_stack([
+            #state[0][0] / self.maxX, state[0][1] / self.maxY,
+            #state[1][0] / self.maxX, state[1][1] / self.maxY
+            states[:, 0] / self.maxX,
+            states[:, 1] / self.maxX
+        ])
+
+    @timed("doodle.best_action")
+    def best_action(self, state):
+
+        if self.q_cache is not None:
+            best, self.q_vector = self.q_cache.lookup(state)
+            return self.actions[best]
+
+        dataset = self.state_to_dataset(state)
+        self.q_vector = self.mlp.predict(dataset)[0] #Vérifier que state soit au bon format
+        action = self.actions[np.argmax(self.q_vector)]
+        return action
+
+    @timed("doodle.best_actions")
+    def best_actions(self, states):
+        # Actions gloutonnes pour un lot d'états, en une seule prédiction (ou lecture du cache)
+
+        if self.q_cache is not None:
+            best, _q_vectors = self.q_cache.lookup_batch(states)
+        else:
+            best = np.argmax(self.mlp.predict(self.states_to_dataset(states)), axis=1)
+
+        return np.asarray(self.actions)[best]
+
+    @timed("doodle.policy_update")
+    def update(self, previous_state, state, last_action, reward, done=False):
+
+        self.remember(previous_state, last_action, reward, state, done)
+
+    @timed("doodle.train")
+    def train(self):
+        super().train()
+
+def train_step(environment, agent, metrics=None, recorder=None):
+
+    action = agent.best_action()
+    state, reward, done = environment.step(action)
+
+    if metrics is not None:
+        metrics.record(action, reward, environment.current_platform_index,
+                       agent.policy.q_vector, done)
+
+    if recorder is not None:
+        recorder.record(action, reward, agent.policy.q_vector)
+        if done:
+            recorder.finish()
+            recorder.start(environment)
+
+    agent.learn(action, state, reward, done)
+    PROFILER.step()
+
+def train(environment, agent, steps, checkpoint_path=None, checkpoint_every=CHECKPOINT_EVERY,
+          metrics=None, recorder=None):
+
+    for i in range(1, steps + 1):
+
+        train_step(environment, agent, metrics, recorder)
+
+        if checkpoint_path is not None and i % checkpoint_every == 0:
+            save_checkpoint(checkpoint_path, agent.policy, agent.counters())
+
+    if checkpoint_path is not None:
+        save_checkpoint(checkpoint_path, agent.policy, agent.counters())
+
+    if metrics is not None:
+        metrics.close()
+
+if __name__ == "__main__":
+
+    environment = Simulation(seed=0)
+    agent = Agent(environment, Policy(seed=0))
+
+    steps = 10000
+    start = time.perf_counter()
+    train(environment, agent, steps)
+    elapsed = time.perf_counter() - start
+
+    print(f"{steps} steps in {elapsed:.2f}s ({steps / elapsed:.0f} steps/s), "
+          f"platform {environment.current_platform_index}")
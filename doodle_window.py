@@ -0,0 +1,308 @@
+import bisect
+import math
+import arcade
+from doodle_sim import (
+    VIEWPORT_WIDTH, VIEWPORT_HEIGHT,
+    ACTION_NOTHING, FRAME_RATE,
+    PLATFORM_SPRITE_HEIGHT,
+    Snapshot
+)
+from checkpoint import CHECKPOINT_EVERY, save_checkpoint
+from trainer import VIEWER_FPS
+from profiling import PROFILER, timed
+
+# Nombre maximum de ticks de simulation rattrapés dans une seule image
+MAX_TICKS_PER_FRAME = 240
+
+# Temps (secondes) mis par la caméra pour parcourir ~63 % de l'écart à la plateforme courante
+CAMERA_LAG = 0.15
+
+textures = {}
+
+def load_texture(filename, flipped_horizontally=False):
+
+    key = (filename, flipped_horizontally)
+
+    if key not in textures:
+        textures[key] = arcade.load_texture(filename, flipped_horizontally=flipped_horizontally)
+
+    return textures[key]
+
+def load_texture_pair(filename):
+    return [
+        load_texture(filename),
+        load_texture(filename, flipped_horizontally=True)
+    ]
+
+class SpritePool:
+    # Sprites réutilisables : on ne recrée pas de sprite quand une plateforme réapparaît
+
+    def __init__(self, filename):
+
+        self.texture = load_texture(filename)
+        self.free = []
+
+    def acquire(self):
+
+        if self.free:
+            return self.free.pop()
+
+        sprite = arcade.Sprite()
+        sprite.texture = self.texture
+
+        return sprite
+
+    def release(self, sprite):
+        self.free.append(sprite)
+
+class Game(arcade.Window):
+    # Fenêtre optionnelle : affiche une Simulation, toute la logique du jeu est dans doodle_sim
+
+    # La simulation avance par ticks fixes de 1 / FRAME_RATE seconde, multipliés par speed,
+    # et l'agent décide tous les simulation.ticks_per_decision ticks : la trajectoire ne dépend
+    # pas du nombre d'images par seconde et est la même qu'avec doodle_sim.train.
+
+    # Avec un BackgroundTrainer, l'entraînement tourne dans son thread à pleine vitesse et la
+    # fenêtre, limitée à VIEWER_FPS images par seconde, ne dessine que son dernier Snapshot.
+
+    def __init__(self, agent, simulation, speed=1, checkpoint_path=None, trainer=None,
+                 metrics=None, recorder=None):
+
+        super().__init__(VIEWPORT_WIDTH, VIEWPORT_HEIGHT, "Doodle Jump")
+
+        self.simulation = simulation
+        self.agent = agent
+        self.speed = speed
+        self.checkpoint_path = checkpoint_path
+        self.trainer = trainer
+        self.metrics = metrics
+        self.recorder = recorder
+
+        self.elapsed_time = 0
+        self.decision_ticks = 0
+        self.current_action = ACTION_NOTHING
+        self.camera_bottom = 0
+
+        # Fond dessiné comme un sprite d'une SpriteList : sa géométrie reste sur le GPU,
+        # seule sa position suit la caméra
+        self.background = arcade.SpriteList()
+        background = arcade.Sprite()
+        background.texture = load_texture("resources/bck.png")
+        background.width = VIEWPORT_WIDTH
+        background.height = VIEWPORT_HEIGHT
+        background.center_x = VIEWPORT_WIDTH / 2
+        background.center_y = VIEWPORT_HEIGHT / 2
+        self.background.append(background)
+
+    def setup(self):
+
+        if self.trainer is None:
+            self.snapshot = Snapshot(self.simulation)
+        else:
+            self.snapshot = self.trainer.latest
+            self.set_update_rate(1 / VIEWER_FPS)
+            self.trainer.start()
+
+        self.reset_viewport()
+
+        self.environment = Environment(self.snapshot, self.camera_bottom)
+
+    @timed("draw")
+    def on_draw(self):
+
+        # Clear the screen to the background color
+        arcade.start_render()
+
+        # Seules les plateformes visibles sont dans la SpriteList : un appel de dessin chacune
+        self.background.draw()
+        self.environment.platforms.draw()
+        self.environment.player.draw()
+
+    def scroll_viewport(self, delta_time):
+        # La caméra rejoint la plateforme courante en ralentissant, sans jamais redescendre
+
+        target = self.snapshot.current_height
+
+        if self.camera_bottom >= target:
+            return
+
+        self.camera_bottom += (target - self.camera_bottom) * (1 - math.exp(-delta_time / CAMERA_LAG))
+        if target - self.camera_bottom < 0.5:
+            self.camera_bottom = target
+
+        self.set_camera()
+
+    def set_camera(self):
+
+        arcade.set_viewport(0, VIEWPORT_WIDTH, self.camera_bottom,
+                            self.camera_bottom + VIEWPORT_HEIGHT)
+
+        background = self.background[0]
+        background.center_y = self.camera_bottom + VIEWPORT_HEIGHT / 2
+
+    def reset_viewport(self):
+        self.camera_bottom = 0
+        self.set_camera()
+
+    def tick(self):
+
+        if self.decision_ticks == 0:
+            self.current_action = self.agent.best_action()
+
+        self.simulation.update_game(self.current_action)
+        self.decision_ticks += 1
+
+        if self.simulation.dead:
+            # La simulation a recommencé le niveau : on revient en bas
+            self.reset_viewport()
+
+        # Même découpage que Simulation.step : une décision s'arrête à la mort du joueur
+        if self.decision_ticks == self.simulation.ticks_per_decision or self.simulation.dead:
+
+            reward = self.simulation.get_reward()
+
+            if self.metrics is not None:
+                self.metrics.record(self.current_action, reward,
+                                    self.simulation.current_platform_index,
+                                    self.agent.policy.q_vector, self.simulation.dead)
+
+            if self.recorder is not None:
+                self.recorder.record(self.current_action, reward, self.agent.policy.q_vector)
+                if self.simulation.dead:
+                    self.recorder.finish()
+                    self.recorder.start(self.simulation)
+
+            self.agent.learn(self.current_action, self.simulation.observe(), reward,
+                             self.simulation.dead)
+
+            self.simulation.dead = False
+            self.simulation.new_platform = False
+            self.decision_ticks = 0
+            PROFILER.step()
+
+            if (self.checkpoint_path is not None and not self.agent.policy.frozen
+                    and self.agent.policy.steps % CHECKPOINT_EVERY == 0):
+                self.save_checkpoint()
+
+    def save_checkpoint(self):
+        save_checkpoint(self.checkpoint_path, self.agent.policy, self.agent.counters())
+
+    def on_close(self):
+
+        if self.trainer is not None:
+            self.trainer.stop()
+
+        if self.metrics is not None:
+            self.metrics.close()
+
+        # Après une erreur de l'entraînement, les poids ne sont pas sûrs : pas de sauvegarde
+        trainer_failed = self.trainer is not None and self.trainer.failed
+
+        if self.checkpoint_path is not None and not self.agent.policy.frozen and not trainer_failed:
+            self.save_checkpoint()
+
+        super().on_close()
+
+    def on_update(self, delta_time):
+
+        if self.trainer is not None:
+            if self.trainer.failed:
+                self.on_close()
+                return
+            self.show(self.trainer.latest, delta_time)
+            return
+
+        self.elapsed_time += delta_time * self.speed
+
+        ticks = int(self.elapsed_time * FRAME_RATE)
+
+        if ticks > MAX_TICKS_PER_FRAME:
+            # Trop de retard : on abandonne le temps non simulé plutôt que de figer la fenêtre
+            ticks = MAX_TICKS_PER_FRAME
+            self.elapsed_time = 0
+        else:
+            self.elapsed_time -= ticks / FRAME_RATE
+
+        for _ in range(ticks):
+            self.tick()
+
+        self.show(Snapshot(self.simulation), delta_time)
+
+    def show(self, snapshot, delta_time):
+
+        if snapshot.current_platform_index < self.snapshot.current_platform_index:
+            # Le niveau a recommencé depuis la dernière image
+            self.reset_viewport()
+
+        self.snapshot = snapshot
+        self.scroll_viewport(delta_time)
+        self.environment.sync(snapshot, self.camera_bottom)
+
+class Environment:
+    # Sprites arcade correspondant à un Snapshot d'une Simulation.
+    # Seules les plateformes qui chevauchent l'écran, de camera_bottom à camera_bottom
+    # + VIEWPORT_HEIGHT, ont un sprite, pris dans un pool : le coût d'une image ne dépend
+    # pas de la hauteur du niveau.
+
+    def __init__(self, snapshot, camera_bottom=0):
+
+        self.setup_platforms()
+        self.setup_player(snapshot, camera_bottom)
+
+    def sync(self, snapshot, camera_bottom):
+
+        self.player.center_x = snapshot.player_x
+        self.player.center_y = snapshot.player_y
+        self.player.set_texture(snapshot.texture)
+
+        self.update_platforms(snapshot, camera_bottom)
+
+    def setup_platforms(self):
+
+        self.platforms = arcade.SpriteList()
+        self.platforms_pool = SpritePool("resources/platform.png")
+        self.platforms_sprites = {}
+        self.materialized = (0, 0)
+
+    def update_platforms(self, snapshot, camera_bottom):
+
+        # Plateformes du Snapshot dont le sprite dépasse dans l'écran
+        first = bisect.bisect_left(snapshot.heights, camera_bottom - PLATFORM_SPRITE_HEIGHT / 2)
+        last = bisect.bisect_right(snapshot.heights,
+                                   camera_bottom + VIEWPORT_HEIGHT + PLATFORM_SPRITE_HEIGHT / 2)
+        visible = snapshot.platforms[first:last]
+
+        if visible:
+            start, end = visible[0][0], visible[-1][0] + 1
+        else:
+            start, end = 0, 0
+
+        if (start, end) == self.materialized:
+            return
+
+        for i in list(self.platforms_sprites):
+            if not start <= i < end:
+                sprite = self.platforms_sprites.pop(i)
+                self.platforms.remove(sprite)
+                self.platforms_pool.release(sprite)
+
+        for i, x, y in visible:
+            if i not in self.platforms_sprites:
+                sprite = self.platforms_pool.acquire()
+                sprite.center_x = x
+                sprite.center_y = y
+                self.platforms.append(sprite)
+                self.platforms_sprites[i] = sprite
+
+        self.materialized = (start, end)
+
+    def setup_player(self, snapshot, camera_bottom):
+
+        filename = "resources/doodle_left.png"
+
+        self.player = arcade.Sprite(scale=0.5)
+        for t in load_texture_pair(filename):
+            self.player.append_texture(t)
+
+        self.player.set_texture(0)
+        self.sync(snapshot, camera_bottom)
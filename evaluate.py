@@ -0,0 +1,224 @@
+import argparse
+import multiprocessing
+import os
+import time
+import numpy as np
+import doodle_sim
+import maze_sim
+from doodle_batch import BatchSimulation
+from qnetwork import NUMPY
+from checkpoint import load_checkpoint, checkpoint_inputs
+from level_bank import LevelBank
+from games import GAME_DOODLE, GAME_MAZE, GAMES
+
+EPISODES = 1000
+EPISODES_PER_CHUNK = 256
+MAX_EPISODE_STEPS = 2000
+PERCENTILES = (5, 50, 95)
+
+def make_policy(game, width=None, height=None):
+    # Policy vide du bon jeu, sur le backend NumPy (plus rapide pour des prédictions par lot)
+
+    if game == GAME_DOODLE:
+        return doodle_sim.Policy(backend=NUMPY)
+
+    return maze_sim.Policy(maze_sim.ACTIONS, width, height, backend=NUMPY)
+
+def evaluate_doodle(policy, episodes, seed, max_steps=MAX_EPISODE_STEPS, levels=None):
+    # episodes parties en parallèle dans une BatchSimulation, une par niveau tiré de seed
+    # ou pris dans levels. Une partie s'arrête à la première mort ou après max_steps décisions.
+
+    environment = BatchSimulation(episodes, levels, seed=seed)
+    states = environment.get_states()
+
+    scores = np.zeros(episodes)
+    lengths = np.zeros(episodes, dtype=np.int64)
+    platforms = np.zeros(episodes, dtype=np.int64)
+    running = np.ones(episodes, dtype=bool)
+
+    for _ in range(max_steps):
+
+        states, rewards, dones = environment.step(policy.best_actions(states))
+
+        # Une partie morte a déjà été remise au début : sa plateforme n'est plus lue
+        np.maximum(platforms, np.where(running & ~dones, environment.current_platform_index, 0),
+                   out=platforms)
+        scores[running] += rewards[running]
+        lengths[running] += 1
+        running &= ~dones
+
+        if not running.any():
+            break
+
+    return scores, platforms, lengths
+
+def evaluate_maze(policy, environment, episodes, seed, max_steps=MAX_EPISODE_STEPS):
+    # episodes parties depuis des cases libres tirées de seed, avancées ensemble avec
+    # apply_batch. La hauteur atteinte est remplacée par l'arrivée à la sortie (0 ou 1).
+
+    tiles = environment.tiles.ravel()
+    free = (tiles != maze_sim.NO_TILE) & (tiles != ord('#'))
+    goal = environment.state_id(environment.goal)
+    free[goal] = False
+
+    rng = np.random.default_rng(seed)
+    state_ids = rng.choice(np.flatnonzero(free), episodes)
+
+    scores = np.zeros(episodes)
+    lengths = np.zeros(episodes, dtype=np.int64)
+    running = np.ones(episodes, dtype=bool)
+
+    for _ in range(max_steps):
+
+        states = np.column_stack(np.divmod(state_ids, environment.columns))
+        new_state_ids, rewards = environment.apply_batch(state_ids, policy.best_action_ids(states))
+
+        scores[running] += rewards[running]
+        lengths[running] += 1
+        state_ids = np.where(running, new_state_ids, state_ids)
+        running &= state_ids != goal
+
+        if not running.any():
+            break
+
+    return scores, (~running).astype(np.int64), lengths
+
+def evaluate_chunk(args):
+    # Point d'entrée des processus : une policy figée reconstruite à partir des poids.
+    # Avec cache_bins, les Q doodle sont lus dans une grille de cache_bins x cache_bins états ;
+    # le labyrinthe utilise toujours son cache exact, une entrée par case.
+
+    # Avec bank, la partie k du paquet joue le niveau first_level + k de la banque.
+
+    game, weights, layout, episodes, seed, max_steps, cache_bins, bank, first_level = args
+
+    if game == GAME_DOODLE:
+        policy = make_policy(game)
+        policy.set_weights(weights)
+        if cache_bins is not None:
+            policy.freeze(cache_bins)
+
+        levels = None
+        if bank is not None:
+            bank = LevelBank.open(bank)
+            levels = [ bank.level((first_level + k) % len(bank)) for k in range(episodes) ]
+
+        return evaluate_doodle(policy, episodes, seed, max_steps, levels)
+
+    environment = maze_sim.Environment(layout)
+    policy = make_policy(game, environment.width, environment.height)
+    policy.set_weights(weights)
+    policy.freeze(environment.height, environment.columns)
+
+    return evaluate_maze(policy, environment, episodes, seed, max_steps)
+
+def evaluate(game, policy, episodes=EPISODES, seed=0, workers=None, layouts=None,
+             max_steps=MAX_EPISODE_STEPS, episodes_per_chunk=EPISODES_PER_CHUNK, cache_bins=None,
+             bank=None):
+    # Joue episodes parties gloutonnes de policy, sans apprendre, réparties par paquets entre
+    # workers processus. Chaque paquet a sa graine (niveaux doodle, cases de départ du
+    # labyrinthe) et, pour le labyrinthe, sa grille prise à tour de rôle dans layouts.
+    # Avec bank (dossier d'une LevelBank), la partie i joue le niveau i de la banque : deux
+    # policies évaluées sur la même banque jouent exactement les mêmes niveaux.
+    # Renvoie les scores, plateformes atteintes (ou sortie atteinte) et durées, par partie.
+
+    if game == GAME_DOODLE and policy.features is not None:
+        # BatchSimulation ne calcule que l'état de get_state
+        raise ValueError("batched evaluation does not support StateFeatures policies")
+
+    if workers is None:
+        workers = os.cpu_count()
+    if layouts is None:
+        layouts = [ maze_sim.MAZE ]
+
+    weights = policy.get_weights()
+
+    chunks = []
+    for i, start in enumerate(range(0, episodes, episodes_per_chunk)):
+        chunks.append((game, weights, layouts[i % len(layouts)],
+                       min(episodes_per_chunk, episodes - start), seed + i, max_steps,
+                       cache_bins, bank, start))
+
+    if workers == 1:
+        results = [ evaluate_chunk(chunk) for chunk in chunks ]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(evaluate_chunk, chunks)
+
+    scores, platforms, lengths = (np.concatenate(column) for column in zip(*results))
+
+    return scores, platforms, lengths
+
+def summarize(scores, platforms, lengths, percentiles=PERCENTILES):
+
+    summary = {
+        "episodes": len(scores),
+        "score_mean": float(scores.mean()),
+        "platform_mean": float(platforms.mean()),
+        "platform_max": int(platforms.max()),
+        "length_mean": float(lengths.mean()),
+    }
+
+    for p, value in zip(percentiles, np.percentile(scores, percentiles)):
+        summary[f"score_p{p}"] = float(value)
+
+    return summary
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("checkpoint", help="checkpoint de la policy à évaluer")
+    parser.add_argument("--game", choices=GAMES, default=GAME_DOODLE)
+    parser.add_argument("--episodes", type=int, default=EPISODES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-steps", type=int, default=MAX_EPISODE_STEPS,
+                        help="décisions au plus par partie")
+    parser.add_argument("--layout", action="append", metavar="FILE",
+                        help="grille de labyrinthe à utiliser (répétable)")
+    parser.add_argument("--corpus", metavar="DIR", default=None,
+                        help="évaluer le labyrinthe sur les grilles d'un corpus (maze_corpus.py)")
+    parser.add_argument("--bank", metavar="DIR", default=None,
+                        help="jouer les niveaux doodle d'une banque (level_bank.py)")
+    parser.add_argument("--cache-bins", type=int, default=None, metavar="BINS",
+                        help="lire les Q doodle dans une grille précalculée de BINS x BINS états")
+    args = parser.parse_args()
+
+    layouts = None
+    if args.layout:
+        layouts = []
+        for path in args.layout:
+            with open(path) as f:
+                layouts.append(f.read())
+
+    if args.game == GAME_DOODLE and args.corpus is None:
+        if checkpoint_inputs(args.checkpoint) != 2:
+            parser.error(f"{args.checkpoint} was trained with doodle.py --features; "
+                         "only two-coordinate policies can be evaluated in batch")
+        policy = make_policy(GAME_DOODLE)
+    else:
+        environment = maze_sim.Environment((layouts or [ maze_sim.MAZE ])[0])
+        policy = make_policy(GAME_MAZE, environment.width, environment.height)
+
+    if args.corpus is not None:
+        from maze_corpus import MazeCorpus, corpus_policy, evaluate_corpus
+        corpus = MazeCorpus.open(args.corpus)
+        policy = corpus_policy(corpus, backend=NUMPY)
+        if checkpoint_inputs(args.checkpoint) != policy.scales.size:
+            parser.error(f"{args.checkpoint} was not trained on a corpus "
+                         "(maze_corpus.py --train), its states have no maze context")
+
+    load_checkpoint(args.checkpoint, policy, inference_only=True)
+
+    start = time.perf_counter()
+    if args.corpus is not None:
+        # Toutes les grilles sont dans les mêmes tables : un seul lot suffit
+        results = evaluate_corpus(policy, corpus, args.episodes, args.max_steps, args.seed)
+    else:
+        results = evaluate(args.game, policy, args.episodes, args.seed, args.workers, layouts,
+                           args.max_steps, cache_bins=args.cache_bins, bank=args.bank)
+    elapsed = time.perf_counter() - start
+
+    for name, value in summarize(*results).items():
+        print(f"{name:14} {value:.2f}" if isinstance(value, float) else f"{name:14} {value}")
+    print(f"{args.episodes} episodes in {elapsed:.2f}s")
@@ -0,0 +1,5 @@
+# Identifiants des deux jeux, partagés par les outils qui traitent l'un ou l'autre
+# (evaluate, sweep, recording). Préfixés GAME_ pour ne pas masquer maze_sim.MAZE, la grille.
+GAME_DOODLE = "doodle"
+GAME_MAZE = "maze"
+GAMES = [ GAME_DOODLE, GAME_MAZE ]
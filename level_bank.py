@@ -0,0 +1,77 @@
+import argparse
+import os
+import random
+import time
+import numpy as np
+from doodle_sim import Simulation, generate_platforms_coordinates
+
+FILES = ("coordinates", "offsets")
+
+class LevelBank:
+    # Niveaux pré-générés rangés bout à bout dans un seul tableau (plateformes, 2) d'entiers,
+    # triés par hauteur, et table offsets : le niveau i est coordinates[offsets[i]:offsets[i + 1]].
+    # Le niveau i est celui de Simulation(seed=first_seed + i). Ouverte avec open, la banque est
+    # en np.memmap : les processus qui l'ouvrent partagent les mêmes pages, sans copie.
+
+    def __init__(self, coordinates, offsets, first_seed=0):
+
+        self.coordinates = coordinates
+        self.offsets = offsets
+        self.first_seed = first_seed
+
+    @classmethod
+    def generate(cls, count, first_seed=0):
+
+        levels = [
+            np.asarray(generate_platforms_coordinates(random.Random(first_seed + i)), dtype=np.int32)
+            for i in range(count)
+        ]
+
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([ len(level) for level in levels ])
+
+        return cls(np.concatenate(levels), offsets, first_seed)
+
+    def save(self, directory):
+
+        os.makedirs(directory, exist_ok=True)
+
+        np.save(os.path.join(directory, "coordinates.npy"), self.coordinates)
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        np.save(os.path.join(directory, "first_seed.npy"), np.array(self.first_seed))
+
+    @classmethod
+    def open(cls, directory):
+
+        coordinates, offsets = (np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+                                for name in FILES)
+        first_seed = np.load(os.path.join(directory, "first_seed.npy")).item()
+
+        return cls(coordinates, offsets, first_seed)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def level(self, level_id):
+        # Vue sur les plateformes du niveau, sans copie
+        return self.coordinates[self.offsets[level_id]:self.offsets[level_id + 1]]
+
+    def simulation(self, level_id, **kwargs):
+        # La graine du niveau est passée à la Simulation pour qu'un recording puisse le rejouer
+        return Simulation(self.level(level_id), seed=self.first_seed + level_id, **kwargs)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0, help="graine du premier niveau")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    bank = LevelBank.generate(args.count, args.seed)
+    bank.save(args.directory)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(bank)} levels, {len(bank.coordinates)} platforms "
+          f"({bank.coordinates.nbytes / 2**20:.1f} MiB) in {elapsed:.2f}s")
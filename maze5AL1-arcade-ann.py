@@ -1,174 +1,99 @@
+import argparse
 import arcade
-import numpy as np
-from sklearn.neural_network import MLPRegressor
-
-MAZE = """
-##.########
-#     #   #
-#     #   #
-#         #
-#         #
-########*##
-"""
-
-UP, DOWN, LEFT, RIGHT = 'U', 'D', 'L', 'R'
-ACTIONS = [UP, DOWN, LEFT, RIGHT]
-
-REWARD_IMPOSSIBLE = -60
-REWARD_STUCK = -6
-REWARD_DEFAULT = -1
-REWARD_GOAL = 60
-
-DEFAULT_LEARNING_RATE = 1
-DEFAULT_DISCOUNT_FACTOR = 0.5
+from maze_sim import MAZE, ACTIONS, ACTION_IDS, Environment, Agent, Policy
+from checkpoint import CHECKPOINT_EVERY, save_checkpoint, load_checkpoint
+from trainer import VIEWER_FPS, BackgroundTrainer
+from profiling import PROFILER, QUIET, VERBOSE, timed
+from games import GAME_MAZE
+from recording import EpisodeRecorder, Recording, ReplayAgent
 
 SPRITE_SIZE = 64
 
-class Environment:
-    def __init__(self, text):
-        self.states = {}
-        lines = text.strip().split('\n')
-        self.height = len(lines)
-        self.width = len(lines[0])
-        for row in range(self.height):
-            for col in range(len(lines[row])):
-                self.states[(row, col)] = lines[row][col]
-                if lines[row][col] == '.':
-                    self.starting_point = (row, col)
-                elif lines[row][col] == '*':
-                    self.goal = (row, col)
-
-    def apply(self, state, action):
-        if action == UP:
-            new_state = (state[0] - 1, state[1])
-        elif action == DOWN:
-            new_state = (state[0] + 1, state[1])
-        elif action == LEFT:
-            new_state = (state[0], state[1] - 1)
-        elif action == RIGHT:
-            new_state = (state[0], state[1] + 1)
-
-        if new_state in self.states:
-            #calculer la récompense
-            if self.states[new_state] in ['#', '.']:
-                reward = REWARD_STUCK
-            elif self.states[new_state] in ['*']: #Sortie du labyrinthe : grosse récompense
-                reward = REWARD_GOAL
-            else:
-                reward = REWARD_DEFAULT
-        else:
-            #Etat impossible: grosse pénalité
-            new_state = state
-            reward = REWARD_IMPOSSIBLE
-
-        return new_state, reward
-
-class Agent:
-    def __init__(self, environment):
-        self.environment = environment
-        self.policy = Policy(ACTIONS, environment.width, environment.height)
-        self.reset()        
-
-    def reset(self):
-        self.state = environment.starting_point
-        self.previous_state = self.state
-        self.score = 0
-
-    def best_action(self):
-        return self.policy.best_action(self.state)
-
-    def do(self, action):
-        self.previous_state = self.state
-        self.state, self.reward = self.environment.apply(self.state, action)
-        self.score += self.reward
-        self.last_action = action
-
-    def update_policy(self):
-        self.policy.update(agent.previous_state, agent.state, self.last_action, self.reward)
-
-class Policy: #ANN
-    def __init__(self, actions, width, height,
-                 learning_rate = DEFAULT_LEARNING_RATE,
-                 discount_factor = DEFAULT_DISCOUNT_FACTOR):
-        
-        self.learning_rate = learning_rate
-        self.discount_factor = discount_factor
-        self.actions = actions
-        self.maxX = width
-        self.maxY = height
-
-        self.mlp = MLPRegressor(hidden_layer_sizes = (8,),
-                                activation = 'tanh',
-                                solver = 'sgd',
-                                learning_rate_init = self.learning_rate,
-                                max_iter = 1,
-                                warm_start = True)
-        self.mlp.fit([[0, 0]], [[0, 0, 0, 0]])
-        self.q_vector = None
-
-    def __repr__(self):
-        return self.q_vector
-
-    def state_to_dataset(self, state):
-        return np.array([[state[0] / self.maxX, state[1] / self.maxY]])
-
-    def best_action(self, state):
-        self.q_vector = self.mlp.predict(self.state_to_dataset(state))[0] #Vérifier que state soit au bon format
-        action = self.actions[np.argmax(self.q_vector)]
-        return action
-
-    def update(self, previous_state, state, last_action, reward):
-        #Q(st, at) = Q(st, at) + learning_rate * (reward + discount_factor * max(Q(state)) - Q(st, at))
-        maxQ = np.amax(self.q_vector)
-        last_action = ACTIONS.index(last_action)
-        print(self.q_vector, maxQ, self.q_vector[last_action])
-        self.q_vector[last_action] += reward + self.discount_factor * maxQ
-
-        inputs = self.state_to_dataset(previous_state)
-        outputs = np.array([self.q_vector])
-        self.mlp.fit(inputs, outputs)
-
 class MazeWindow(arcade.Window):
-    def __init__(self, agent):
+    def __init__(self, agent, checkpoint_path=None, trainer=None, recorder=None):
         super().__init__(agent.environment.width * SPRITE_SIZE,
                          agent.environment.height * SPRITE_SIZE,
                          "Escape from ESGI")
         self.agent = agent
+        self.checkpoint_path = checkpoint_path
+        # Avec un BackgroundTrainer, la fenêtre affiche seulement son dernier (état, score)
+        self.trainer = trainer
+        self.score = agent.score
+        self.recorder = recorder
 
     def setup(self):
         self.walls = arcade.SpriteList()
         
-        for state in agent.environment.states:
-            if agent.environment.states[state] == '#':
+        for state in self.agent.environment.states:
+            if self.agent.environment.states[state] == '#':
                 sprite = arcade.Sprite(":resources:images/tiles/grassCenter.png", 0.5)
                 sprite.center_x = sprite.width * (state[1] + 0.5)
-                sprite.center_y = sprite.height * (agent.environment.height - state[0] - 0.5)
+                sprite.center_y = sprite.height * (self.agent.environment.height - state[0] - 0.5)
                 self.walls.append(sprite)
 
 
         self.goal = arcade.Sprite(":resources:images/items/flagGreen1.png", 0.5)
         self.goal.center_x = self.goal.width * (self.agent.environment.goal[1] + 0.5)
-        self.goal.center_y = self.goal.height * (agent.environment.height - self.agent.environment.goal[0] - 0.5)
+        self.goal.center_y = self.goal.height * (self.agent.environment.height - self.agent.environment.goal[0] - 0.5)
 
         self.player = arcade.Sprite(":resources:images/animated_characters/robot/robot_idle.png",
                                     0.5)
-        self.update_player_xy()
+        self.update_player_xy(self.agent.state)
 
-    def update_player_xy(self):
-        self.player.center_x = self.player.height * (self.agent.state[1] + 0.5)
-        self.player.center_y = self.player.height * (agent.environment.height - self.agent.state[0] - 0.5)
+        if self.trainer is not None:
+            self.set_update_rate(1 / VIEWER_FPS)
+            self.trainer.start()
+
+    def update_player_xy(self, state):
+        self.player.center_x = self.player.height * (state[1] + 0.5)
+        self.player.center_y = self.player.height * (self.agent.environment.height - state[0] - 0.5)
 
     def on_update(self, delta_time):
-        if agent.state != environment.goal:
+        if self.trainer is not None:
+            if self.trainer.failed:
+                self.on_close()
+                return
+            state, self.score = self.trainer.latest
+            self.update_player_xy(state)
+            return
+
+        if self.agent.state != self.agent.environment.goal:
             action = self.agent.best_action()
             self.agent.do(action)
             self.agent.update_policy()
-            self.update_player_xy()
+            self.update_player_xy(self.agent.state)
+            self.score = self.agent.score
+            PROFILER.step()
+
+            if self.recorder is not None:
+                self.recorder.record(ACTION_IDS[action], self.agent.reward,
+                                     self.agent.policy.q_vector)
+                if self.agent.state == self.agent.environment.goal:
+                    self.recorder.finish()
+
+            if (self.checkpoint_path is not None and not self.agent.policy.frozen
+                    and self.agent.policy.steps % CHECKPOINT_EVERY == 0):
+                self.save_checkpoint()
+
+    def save_checkpoint(self):
+        save_checkpoint(self.checkpoint_path, self.agent.policy, self.agent.counters())
+
+    def on_close(self):
+        if self.trainer is not None:
+            self.trainer.stop()
+        # Après une erreur de l'entraînement, les poids ne sont pas sûrs : pas de sauvegarde
+        trainer_failed = self.trainer is not None and self.trainer.failed
+        if self.checkpoint_path is not None and not self.agent.policy.frozen and not trainer_failed:
+            self.save_checkpoint()
+        super().on_close()
 
     def on_key_press(self, key, modifiers):
         if key == arcade.key.R:
             self.agent.reset()
+            if self.recorder is not None:
+                self.recorder.start(self.agent.environment, self.agent.state)
 
+    @timed("draw")
     def on_draw(self):
         arcade.start_render()
         
@@ -176,16 +101,102 @@ class MazeWindow(arcade.Window):
         self.goal.draw()
         self.player.draw()
 
-        arcade.draw_text(f"Score: {self.agent.score}", 10, 10, arcade.csscolor.WHITE, 20)
+        arcade.draw_text(f"Score: {self.score}", 10, 10, arcade.csscolor.WHITE, 20)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--checkpoint", metavar="PATH", default=None,
+                        help=f"sauvegarder l'entraînement tous les {CHECKPOINT_EVERY} pas")
+    parser.add_argument("--resume", metavar="PATH", default=None,
+                        help="reprendre l'entraînement depuis un checkpoint")
+    parser.add_argument("--inference", metavar="PATH", default=None,
+                        help="jouer avec les poids d'un checkpoint, sans apprendre")
+    parser.add_argument("--background", action="store_true",
+                        help="entraîner dans un thread à pleine vitesse, la fenêtre suit")
+    parser.add_argument("--verbose", action="store_true",
+                        help="afficher les Q-vecteurs à chaque mise à jour")
+    parser.add_argument("--record", metavar="DIR", default=None,
+                        help="enregistrer chaque partie jusqu'à la sortie dans DIR")
+    parser.add_argument("--record-q", action="store_true",
+                        help="garder aussi les Q-vecteurs dans les enregistrements")
+    parser.add_argument("--replay", metavar="PATH", default=None,
+                        help="rejouer une partie enregistrée, sans Policy")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="avec --replay, pas rejoués par seconde")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="chronométrer les étapes, rapport périodique sur stderr et bilan dans PATH")
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        PROFILER.enable()
+
+    if args.replay is not None:
+        ignored = [ name for name in ("checkpoint", "resume", "inference", "background",
+                                      "verbose", "record", "record_q")
+                    if getattr(args, name) != parser.get_default(name) ]
+        if ignored:
+            parser.error("--replay cannot be combined with "
+                         + ", ".join("--" + name.replace("_", "-") for name in ignored))
+
+        recording = Recording.load(args.replay)
+        environment = recording.environment()
+        window = MazeWindow(ReplayAgent(recording, environment))
+        window.setup()
+        if args.rate is not None:
+            window.set_update_rate(1 / args.rate)
+        arcade.run()
+        raise SystemExit
+
     #Initialiser l'environment
     environment = Environment(MAZE)
 
     #Initialiser l'agent
-    agent = Agent(environment)
+    agent = Agent(environment, Policy(ACTIONS, environment.width, environment.height,
+                                      verbose=VERBOSE if args.verbose else QUIET))
+
+    if args.resume is not None:
+        agent.restore(load_checkpoint(args.resume, agent.policy))
+    elif args.inference is not None:
+        load_checkpoint(args.inference, agent.policy, inference_only=True)
+        agent.policy.freeze(environment.height, environment.columns)
+
+    checkpoint_path = args.checkpoint
+    if checkpoint_path is None and args.inference is None:
+        checkpoint_path = args.resume
+
+    recorder = None
+    if args.record is not None:
+        recorder = EpisodeRecorder(GAME_MAZE, environment, agent.state, directory=args.record,
+                                   q_vectors=args.record_q)
+
+    trainer = None
+    if args.background:
+
+        def step():
+            # Sans fenêtre pour appuyer sur R : on recommence dès la sortie atteinte
+            if agent.state == environment.goal:
+                agent.reset()
+                if recorder is not None:
+                    recorder.start(environment, agent.state)
+            action = agent.best_action()
+            agent.do(action)
+            agent.update_policy()
+            PROFILER.step()
+            if recorder is not None:
+                recorder.record(ACTION_IDS[action], agent.reward, agent.policy.q_vector)
+                if agent.state == environment.goal:
+                    recorder.finish()
+            if (checkpoint_path is not None and not agent.policy.frozen
+                        and agent.policy.steps % CHECKPOINT_EVERY == 0):
+                save_checkpoint(checkpoint_path, agent.policy, agent.counters())
+
+        trainer = BackgroundTrainer(step, lambda: (agent.state, agent.score))
 
     #Lancer le jeu
-    window = MazeWindow(agent)
+    window = MazeWindow(agent, checkpoint_path, trainer, recorder)
     window.setup()
     arcade.run()
+    if args.profile is not None:
+        PROFILER.export(args.profile)
+    if trainer is not None and trainer.failed:
+        raise SystemExit(1)
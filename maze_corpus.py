@@ -0,0 +1,318 @@
+import argparse
+import os
+import random
+import time
+import numpy as np
+from maze_sim import (
+    ACTIONS, NO_TILE, REWARD_STUCK,
+    Environment, Policy,
+    compile_tiles
+)
+
+MAZE_ROWS = 11
+MAZE_COLUMNS = 11
+BATCH_COUNT = 256
+
+# Paramètres par défaut de corpus_policy : les sorties sont à des dizaines de pas, il faut
+# un horizon plus long et un réseau plus large que pour MAZE seul
+CORPUS_LEARNING_RATE = 0.05
+CORPUS_DISCOUNT_FACTOR = 0.95
+CORPUS_HIDDEN_LAYER_SIZES = (64, 64)
+# Part d'actions tirées au hasard pendant train_corpus : sans elles un réseau qui prend
+# l'habitude de buter sur un mur ne voit plus jamais la sortie
+CORPUS_EXPLORATION = 0.1
+
+def read_layouts(path):
+    # Grilles d'un fichier texte, séparées par des lignes vides
+
+    with open(path) as f:
+        blocks = f.read().split("\n\n")
+
+    return [ block.strip("\n") for block in blocks if block.strip() ]
+
+def generate_maze(rows=MAZE_ROWS, columns=MAZE_COLUMNS, rng=random):
+    # Labyrinthe parfait (un seul chemin entre deux cases) creusé par parcours en profondeur
+    # sur les cases d'indices impairs : toujours soluble. Départ dans le mur du haut, sortie
+    # dans le mur du bas, comme MAZE. rows et columns sont arrondis à l'impair supérieur.
+
+    rows += 1 - rows % 2
+    columns += 1 - columns % 2
+
+    grid = [ [ '#' ] * columns for _ in range(rows) ]
+
+    start = (1, 2 * rng.randrange(columns // 2) + 1)
+    grid[start[0]][start[1]] = ' '
+    stack = [ start ]
+
+    while stack:
+
+        row, col = stack[-1]
+        neighbours = [
+            (row + d_row, col + d_col)
+            for d_row, d_col in ((-2, 0), (2, 0), (0, -2), (0, 2))
+            if 0 < row + d_row < rows - 1 and 0 < col + d_col < columns - 1
+            and grid[row + d_row][col + d_col] == '#'
+        ]
+
+        if not neighbours:
+            stack.pop()
+            continue
+
+        new_row, new_col = rng.choice(neighbours)
+        grid[(row + new_row) // 2][(col + new_col) // 2] = ' '
+        grid[new_row][new_col] = ' '
+        stack.append((new_row, new_col))
+
+    grid[0][2 * rng.randrange(columns // 2) + 1] = '.'
+    grid[rows - 1][2 * rng.randrange(columns // 2) + 1] = '*'
+
+    return "\n".join("".join(line) for line in grid)
+
+def generate_layouts(count, seed=None, rows=MAZE_ROWS, columns=MAZE_COLUMNS):
+    rng = random.Random(seed)
+    return [ generate_maze(rows, columns, rng) for _ in range(count) ]
+
+class MazeCorpus:
+    # Grilles rangées dans un seul tableau uint8 (count, height, columns), complété par NO_TILE,
+    # avec les tables des départs, sorties et tailles de chaque grille.
+    # save écrit des .npy qu'open relit en np.memmap : rien n'est analysé ni copié à l'ouverture.
+
+    FILES = ("tiles", "starts", "goals", "sizes")
+
+    def __init__(self, tiles, starts, goals, sizes):
+
+        self.tiles = tiles
+        self.starts = starts
+        self.goals = goals
+        self.sizes = sizes
+
+        self.count, self.height, self.columns = tiles.shape
+
+    @classmethod
+    def from_layouts(cls, layouts):
+
+        environments = [ Environment(text) for text in layouts ]
+
+        height = max(e.height for e in environments)
+        columns = max(e.columns for e in environments)
+
+        tiles = np.full((len(environments), height, columns), NO_TILE, dtype=np.uint8)
+        starts = np.zeros((len(environments), 2), dtype=np.int32)
+        goals = np.zeros((len(environments), 2), dtype=np.int32)
+        sizes = np.zeros((len(environments), 2), dtype=np.int32)
+
+        for i, e in enumerate(environments):
+            tiles[i, :e.height, :e.columns] = e.tiles
+            starts[i] = e.starting_point
+            goals[i] = e.goal
+            sizes[i] = (e.height, e.columns)
+
+        return cls(tiles, starts, goals, sizes)
+
+    def save(self, directory):
+
+        os.makedirs(directory, exist_ok=True)
+
+        for name in self.FILES:
+            np.save(os.path.join(directory, name + ".npy"), getattr(self, name))
+
+    @classmethod
+    def open(cls, directory):
+        return cls(*(np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+                     for name in cls.FILES))
+
+    def __len__(self):
+        return self.count
+
+    def layout(self, i):
+        # Texte de la grille i, pour construire un Environment (fenêtre, solveur)
+
+        height, columns = self.sizes[i]
+        return "\n".join(
+            bytes(row[row != NO_TILE]).decode("ascii")
+            for row in self.tiles[i, :height, :columns]
+        )
+
+    def environment(self, i):
+        return Environment(self.layout(i))
+
+    def state_ids(self, mazes, states):
+        # Identifiants à plat (ceux de compile_tiles) des cases states des grilles mazes
+        return (mazes * self.height + states[:, 0]) * self.columns + states[:, 1]
+
+class MazeBatch:
+    # count parties sur des grilles du corpus tirées au hasard, avancées ensemble par
+    # lecture dans les tables de compile_tiles pour tout le corpus. Une partie qui atteint
+    # la sortie recommence au départ d'une autre grille.
+    # L'état d'une partie dépend de sa grille : (row, col), décalage jusqu'à la sortie, murs
+    # autour de la case et dernière action, pour une Policy créée avec context=True
+    # (corpus_policy). last_action_ids vaut -1 au départ d'une partie.
+
+    def __init__(self, corpus, count=BATCH_COUNT, seed=None):
+
+        self.corpus = corpus
+        self.count = count
+        self.random = np.random.default_rng(seed)
+
+        self.transitions, self.rewards = compile_tiles(np.asarray(corpus.tiles))
+        self.goals = np.asarray(corpus.goals)
+        self.goal_ids = corpus.state_ids(np.arange(len(corpus)), self.goals)
+
+        # Actions qui butent sur un mur ou sortent de la grille, lues dans la table des récompenses
+        self.blocked = self.rewards <= REWARD_STUCK
+
+        self.mazes = np.zeros(count, dtype=np.intp)
+        self.state_ids = np.zeros(count, dtype=np.intp)
+        self.last_action_ids = np.full(count, -1, dtype=np.intp)
+
+        self.reset()
+
+    def reset(self, mask=None):
+
+        if mask is None:
+            mask = np.ones(self.count, dtype=bool)
+
+        mazes = self.random.integers(0, len(self.corpus), mask.sum())
+        self.mazes[mask] = mazes
+        self.state_ids[mask] = self.corpus.state_ids(mazes, np.asarray(self.corpus.starts)[mazes])
+        self.last_action_ids[mask] = -1
+
+        return self.get_states()
+
+    def get_states(self):
+        # (row, col, d_row, d_col, murs des 4 actions, dernière action) de chaque partie
+
+        cells = self.state_ids % (self.corpus.height * self.corpus.columns)
+        rows, cols = np.divmod(cells, self.corpus.columns)
+        goals = self.goals[self.mazes]
+        headings = self.last_action_ids[:, None] == np.arange(len(ACTIONS))
+
+        return np.column_stack((rows, cols, goals[:, 0] - rows, goals[:, 1] - cols,
+                                self.blocked[self.state_ids], headings))
+
+    def step(self, action_ids):
+        # Renvoie les nouveaux états, les récompenses et les parties finies à la sortie ;
+        # celles-ci sont déjà remises au départ d'une nouvelle grille
+
+        rewards = self.rewards[self.state_ids, action_ids]
+        self.state_ids = self.transitions[self.state_ids, action_ids]
+        self.last_action_ids[:] = action_ids
+
+        dones = self.state_ids == self.goal_ids[self.mazes]
+        next_states = self.get_states()
+
+        if dones.any():
+            self.reset(dones)
+
+        return next_states, rewards, dones
+
+def corpus_policy(corpus, **kwargs):
+    # Policy normalisée par la taille commune des grilles du corpus, pas par celle d'une grille,
+    # et qui reçoit le contexte de MazeBatch.get_states : la même case de deux grilles
+    # différentes n'est pas le même état
+
+    kwargs.setdefault("learning_rate", CORPUS_LEARNING_RATE)
+    kwargs.setdefault("discount_factor", CORPUS_DISCOUNT_FACTOR)
+    kwargs.setdefault("hidden_layer_sizes", CORPUS_HIDDEN_LAYER_SIZES)
+
+    return Policy(ACTIONS, corpus.columns, corpus.height, context=True, **kwargs)
+
+def train_corpus(policy, batch, steps, exploration=CORPUS_EXPLORATION):
+    # steps pas de chacune des batch.count parties : une prédiction et un lot de transitions
+    # par pas pour toutes les parties, une part exploration des actions au hasard.
+    # Renvoie le nombre de sorties atteintes.
+
+    states = batch.get_states()
+    finished = 0
+
+    for _ in range(steps):
+
+        action_ids = policy.best_action_ids(states)
+        explore = batch.random.random(batch.count) < exploration
+        action_ids = np.where(explore, batch.random.integers(0, len(ACTIONS), batch.count),
+                              action_ids)
+        next_states, rewards, dones = batch.step(action_ids)
+
+        policy.update_batch(states, action_ids, rewards, next_states, dones)
+
+        finished += dones.sum()
+        states = batch.get_states()
+
+    return finished
+
+def evaluate_corpus(policy, corpus, episodes, max_steps, seed=None):
+    # episodes parties gloutonnes, sans apprendre, depuis le départ de grilles tirées au hasard.
+    # Même résultat qu'evaluate.evaluate_maze : scores, sortie atteinte (0 ou 1), durées.
+
+    batch = MazeBatch(corpus, episodes, seed)
+    states = batch.get_states()
+
+    scores = np.zeros(episodes)
+    lengths = np.zeros(episodes, dtype=np.int64)
+    running = np.ones(episodes, dtype=bool)
+
+    for _ in range(max_steps):
+
+        # Pas de batch.step : une partie finie doit rester à la sortie, pas recommencer
+        action_ids = policy.best_action_ids(states)
+        rewards = batch.rewards[batch.state_ids, action_ids]
+        batch.state_ids = np.where(running, batch.transitions[batch.state_ids, action_ids],
+                                   batch.state_ids)
+        batch.last_action_ids = np.where(running, action_ids, batch.last_action_ids)
+
+        scores[running] += rewards[running]
+        lengths[running] += 1
+        running &= batch.state_ids != batch.goal_ids[batch.mazes]
+        states = batch.get_states()
+
+        if not running.any():
+            break
+
+    return scores, (~running).astype(np.int64), lengths
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", help="dossier du corpus (créé s'il n'existe pas)")
+    parser.add_argument("--generate", type=int, metavar="COUNT", default=None,
+                        help="générer COUNT labyrinthes aléatoires dans le corpus")
+    parser.add_argument("--layouts", nargs="*", metavar="FILE", default=[],
+                        help="fichiers de grilles séparées par des lignes vides")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("ROWS", "COLUMNS"),
+                        default=(MAZE_ROWS, MAZE_COLUMNS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--train", type=int, metavar="STEPS", default=None,
+                        help="entraîner une policy STEPS pas sur BATCH_COUNT parties à la fois")
+    parser.add_argument("--checkpoint", metavar="PATH", default=None,
+                        help="avec --train, sauvegarder la policy (évaluable avec evaluate.py --corpus)")
+    args = parser.parse_args()
+
+    if args.generate is not None or args.layouts:
+        layouts = []
+        for path in args.layouts:
+            layouts += read_layouts(path)
+        if args.generate is not None:
+            layouts += generate_layouts(args.generate, args.seed, *args.size)
+
+        MazeCorpus.from_layouts(layouts).save(args.directory)
+
+    corpus = MazeCorpus.open(args.directory)
+    print(f"{len(corpus)} mazes of {corpus.height}x{corpus.columns}")
+
+    if args.train is not None:
+        from qnetwork import NUMPY
+
+        batch = MazeBatch(corpus, seed=args.seed)
+        policy = corpus_policy(corpus, backend=NUMPY, seed=args.seed)
+
+        start = time.perf_counter()
+        finished = train_corpus(policy, batch, args.train)
+        elapsed = time.perf_counter() - start
+
+        transitions = args.train * batch.count
+        print(f"{transitions} transitions in {elapsed:.2f}s ({transitions / elapsed:.0f}/s), "
+              f"{finished} exits reached")
+
+        if args.checkpoint is not None:
+            from checkpoint import save_checkpoint
+            save_checkpoint(args.checkpoint, policy)
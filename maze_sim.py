@@ -0,0 +1,248 @@
+import numpy as np
+from qnetwork import SKLEARN
+from q_learning import QLearningPolicy
+from profiling import QUIET, timed
+from qcache import QCache
+
+MAZE = """
+##.########
+#     #   #
+#     #   #
+#         #
+#         #
+########*##
+"""
+
+UP, DOWN, LEFT, RIGHT = 'U', 'D', 'L', 'R'
+ACTIONS = [UP, DOWN, LEFT, RIGHT]
+ACTION_IDS = { action: i for i, action in enumerate(ACTIONS) }
+MOVES = { UP: (-1, 0), DOWN: (1, 0), LEFT: (0, -1), RIGHT: (0, 1) }
+
+# Case absente de la grille (ligne plus courte que les autres)
+NO_TILE = 0
+
+REWARD_IMPOSSIBLE = -60
+REWARD_STUCK = -6
+REWARD_DEFAULT = -1
+REWARD_GOAL = 60
+
+DEFAULT_LEARNING_RATE = 1
+DEFAULT_DISCOUNT_FACTOR = 0.5
+HIDDEN_LAYER_SIZES = (8,)
+
+# Contexte ajouté à (row, col) quand la Policy joue sur plusieurs grilles : décalage
+# (d_row, d_col) jusqu'à la sortie, pour chaque action 1 si elle bute sur un mur, et la
+# dernière action jouée en one-hot (la direction suivie, de quoi longer un mur)
+CONTEXT_SIZE = 2 + 4 + 4
+
+REPLAY_CAPACITY = 10000
+BATCH_SIZE = 64
+TRAIN_EVERY = 8
+
+Q_BACKEND = SKLEARN
+
+def compile_tiles(tiles):
+    # Tables (state_id, action_id) -> état suivant et récompense pour une grille (height, columns)
+    # ou un lot de grilles de même taille (count, height, columns), complétées par NO_TILE.
+    # state_id = (maze * height + row) * columns + col : indice à plat dans tiles.
+
+    height, columns = tiles.shape[-2:]
+    mazes, rows, cols = np.indices((tiles.size // (height * columns), height, columns))
+    tiles = tiles.reshape(mazes.shape)
+    ids = (mazes * height + rows) * columns + cols
+
+    # Tables compactes, elles couvrent tout un corpus : int32 pour les identifiants tant
+    # qu'ils tiennent, int16 pour les récompenses (de REWARD_IMPOSSIBLE à REWARD_GOAL)
+    id_type = np.int32 if tiles.size <= np.iinfo(np.int32).max else np.intp
+    transitions = np.zeros((tiles.size, len(ACTIONS)), dtype=id_type)
+    rewards = np.zeros((tiles.size, len(ACTIONS)), dtype=np.int16)
+
+    for action_id, action in enumerate(ACTIONS):
+        d_row, d_col = MOVES[action]
+        new_rows = rows + d_row
+        new_cols = cols + d_col
+
+        inside = (new_rows >= 0) & (new_rows < height) \
+            & (new_cols >= 0) & (new_cols < columns)
+        new_rows = np.where(inside, new_rows, rows)
+        new_cols = np.where(inside, new_cols, cols)
+
+        tile = tiles[mazes, new_rows, new_cols]
+        possible = inside & (tile != NO_TILE)
+
+        #calculer la récompense
+        reward = np.full(tiles.shape, REWARD_DEFAULT, dtype=np.int16)
+        reward[np.isin(tile, [ord('#'), ord('.')])] = REWARD_STUCK
+        reward[tile == ord('*')] = REWARD_GOAL #Sortie du labyrinthe : grosse récompense
+        #Etat impossible: grosse pénalité
+        reward[~possible] = REWARD_IMPOSSIBLE
+
+        new_ids = (mazes * height + new_rows) * columns + new_cols
+        transitions[:, action_id] = np.where(possible, new_ids, ids).ravel()
+        rewards[:, action_id] = reward.ravel()
+
+    return transitions, rewards
+
+class Environment:
+    # La grille est compilée en un tableau uint8 de caractères et en deux tables
+    # (state_id, action_id) -> état suivant et récompense : apply ne fait que des lectures
+    # dans ces tables, pour un état (apply) ou pour un lot d'états (apply_batch).
+    # state_id = row * columns + col.
+
+    def __init__(self, text):
+        self.states = {}
+        lines = text.strip().split('\n')
+        self.height = len(lines)
+        self.width = len(lines[0])
+        for row in range(self.height):
+            for col in range(len(lines[row])):
+                self.states[(row, col)] = lines[row][col]
+                if lines[row][col] == '.':
+                    self.starting_point = (row, col)
+                elif lines[row][col] == '*':
+                    self.goal = (row, col)
+
+        self.columns = max(len(line) for line in lines)
+        self.tiles = np.full((self.height, self.columns), NO_TILE, dtype=np.uint8)
+        for row, line in enumerate(lines):
+            self.tiles[row, :len(line)] = np.frombuffer(line.encode('ascii'), dtype=np.uint8)
+
+        self.compile()
+
+    def compile(self):
+
+        self.transitions, self.rewards = compile_tiles(self.tiles)
+
+        # Copies en listes Python : plus rapides que l'indexation NumPy pour un seul état
+        self.transition_table = self.transitions.tolist()
+        self.reward_table = self.rewards.tolist()
+
+    def state_id(self, state):
+        return state[0] * self.columns + state[1]
+
+    def state_from_id(self, state_id):
+        return divmod(state_id, self.columns)
+
+    def apply(self, state, action):
+        state_id = state[0] * self.columns + state[1]
+        action_id = ACTION_IDS[action]
+
+        new_state = divmod(self.transition_table[state_id][action_id], self.columns)
+        reward = self.reward_table[state_id][action_id]
+
+        return new_state, reward
+
+    def apply_batch(self, state_ids, action_ids):
+        return self.transitions[state_ids, action_ids], self.rewards[state_ids, action_ids]
+
+class Agent:
+    def __init__(self, environment, policy=None):
+        self.environment = environment
+        if policy is None:
+            policy = Policy(ACTIONS, environment.width, environment.height)
+        self.policy = policy
+        self.reset()        
+
+    def reset(self):
+        self.state = self.environment.starting_point
+        self.previous_state = self.state
+        self.score = 0
+
+    def best_action(self):
+        return self.policy.best_action(self.state)
+
+    def do(self, action):
+        self.previous_state = self.state
+        self.state, self.reward = self.environment.apply(self.state, action)
+        self.score += self.reward
+        self.last_action = action
+
+    def counters(self):
+        return { "score": self.score }
+
+    def restore(self, counters):
+        self.score = counters.get("score", 0)
+
+    def update_policy(self):
+        self.policy.update(self.previous_state, self.state, self.last_action, self.reward,
+                           self.state == self.environment.goal)
+
+class Policy(QLearningPolicy): #ANN
+    def __init__(self, actions, width, height,
+                 learning_rate = DEFAULT_LEARNING_RATE,
+                 discount_factor = DEFAULT_DISCOUNT_FACTOR,
+                 replay_capacity = REPLAY_CAPACITY,
+                 batch_size = BATCH_SIZE,
+                 train_every = TRAIN_EVERY,
+                 backend = Q_BACKEND,
+                 seed = None,
+                 verbose = QUIET,
+                 hidden_layer_sizes = HIDDEN_LAYER_SIZES,
+                 context = False):
+        
+        self.actions = actions
+        self.maxX = width
+        self.maxY = height
+        self.verbose = verbose
+
+        # Avec context, les états sont ceux de maze_corpus.MazeBatch : (row, col) suivis des
+        # CONTEXT_SIZE valeurs qui distinguent une grille d'une autre
+        self.context = context
+        scales = [ self.maxX, self.maxY ]
+        if context:
+            scales += [ self.maxX, self.maxY ] + [ 1 ] * (CONTEXT_SIZE - 2)
+        self.scales = np.array(scales, dtype=float)
+
+        super().__init__(len(scales), len(self.actions), 'sgd', learning_rate, discount_factor,
+                         replay_capacity, batch_size, train_every, backend, seed,
+                         hidden_layer_sizes)
+        self.q_vector = None
+
+    def freeze(self, rows=None, columns=None):
+        # Inférence seule : Q précalculé pour chaque case, best_action devient une lecture exacte
+        if self.context:
+            raise ValueError("the Q cache only covers (row, col) states, not the corpus context")
+
+        rows = self.maxY if rows is None else rows
+        columns = self.maxX if columns is None else columns
+        self.frozen = True
+        self.q_cache = QCache(self, (0, 0), (rows - 1, columns - 1), (rows, columns))
+
+    def states_to_dataset(self, states):
+        return np.asarray(states, dtype=float) / self.scales
+
+    @timed("maze.best_action")
+    def best_action(self, state):
+        if self.q_cache is not None:
+            best, self.q_vector = self.q_cache.lookup(state)
+            return self.actions[best]
+
+        self.q_vector = self.mlp.predict(self.state_to_dataset(state))[0] #Vérifier que state soit au bon format
+        action = self.actions[np.argmax(self.q_vector)]
+        return action
+
+    def best_action_ids(self, states):
+        # Indices des actions gloutonnes pour un lot d'états, en une seule prédiction
+        # (ou lecture du cache)
+        if self.q_cache is not None:
+            best, _q_vectors = self.q_cache.lookup_batch(states)
+            return best
+        return np.argmax(self.mlp.predict(self.states_to_dataset(states)), axis=1)
+
+    def best_actions(self, states):
+        return np.asarray(self.actions)[self.best_action_ids(states)]
+
+    @timed("maze.policy_update")
+    def update(self, previous_state, state, last_action, reward, done=False):
+        if self.frozen:
+            return
+
+        last_action = self.actions.index(last_action)
+        if self.verbose:
+            print(self.q_vector, np.amax(self.q_vector), self.q_vector[last_action])
+
+        self.remember(previous_state, last_action, reward, state, done)
+
+    @timed("maze.train")
+    def train(self):
+        super().train()
@@ -0,0 +1,99 @@
+import time
+import numpy as np
+from maze_sim import (
+    MAZE, ACTIONS, NO_TILE,
+    DEFAULT_DISCOUNT_FACTOR,
+    Environment
+)
+
+TOLERANCE = 1e-6
+MAX_ITERATIONS = 10000
+
+def value_iteration(environment, discount_factor=DEFAULT_DISCOUNT_FACTOR,
+                    tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    # Q optimal de tout le labyrinthe par itération sur les valeurs, avec les tables
+    # de transition et de récompense d'Environment. L'épisode s'arrête sur la sortie.
+    # Renvoie la table Q (state_id, action_id) et le nombre d'itérations.
+
+    transitions = environment.transitions
+    rewards = environment.rewards
+
+    terminal = np.zeros(len(transitions), dtype=bool)
+    terminal[environment.state_id(environment.goal)] = True
+    continues = ~terminal[transitions]
+
+    values = np.zeros(len(transitions))
+
+    for iteration in range(1, max_iterations + 1):
+
+        q_table = rewards + discount_factor * values[transitions] * continues
+        new_values = q_table.max(axis=1)
+        new_values[terminal] = 0
+
+        delta = np.abs(new_values - values).max()
+        values = new_values
+
+        if delta < tolerance:
+            break
+
+    return q_table, iteration
+
+class TabularPolicy:
+    # Policy gloutonne sur une table Q exacte : référence pour les policies ANN
+
+    def __init__(self, environment, q_table, actions=ACTIONS):
+        self.environment = environment
+        self.q_table = q_table
+        self.actions = actions
+        self.q_vector = None
+
+    def best_action(self, state):
+        self.q_vector = self.q_table[self.environment.state_id(state)]
+        return self.actions[np.argmax(self.q_vector)]
+
+def policy_agreement(policy, environment, q_table):
+    # Compare une Policy ANN à la table Q exacte sur toutes les cases libres :
+    # part des cases où l'action gloutonne est optimale, et erreur moyenne sur Q
+
+    tiles = environment.tiles.ravel()
+    free = (tiles != NO_TILE) & (tiles != ord('#'))
+    free[environment.state_id(environment.goal)] = False
+
+    state_ids = np.flatnonzero(free)
+    states = np.column_stack(np.divmod(state_ids, environment.columns))
+
+    predicted = policy.mlp.predict(policy.states_to_dataset(states))
+    exact = q_table[state_ids]
+
+    chosen = np.argmax(predicted, axis=1)
+    optimal = exact[np.arange(len(state_ids)), chosen] >= exact.max(axis=1) - TOLERANCE
+
+    return optimal.mean(), np.abs(predicted - exact).mean()
+
+if __name__ == "__main__":
+
+    environment = Environment(MAZE)
+    q_table, iterations = value_iteration(environment)
+
+    print(f"{iterations} iterations")
+    policy = TabularPolicy(environment, q_table)
+
+    state = environment.starting_point
+    path = [ state ]
+    while state != environment.goal and len(path) < environment.tiles.size:
+        state, _reward = environment.apply(state, policy.best_action(state))
+        path.append(state)
+    print("path:", path)
+
+    # Grande salle vide pour mesurer le temps de résolution
+    size = 200
+    rows = [ "#" * size ]
+    rows[0] = "#." + "#" * (size - 2)
+    rows += [ "#" + " " * (size - 2) + "#" for _ in range(size - 2) ]
+    rows.append("#" * (size - 2) + "*#")
+    large = Environment("\n".join(rows))
+
+    start = time.perf_counter()
+    q_table, iterations = value_iteration(large)
+    print(f"{large.tiles.size} cells solved in {time.perf_counter() - start:.3f}s "
+          f"({iterations} iterations)")
@@ -0,0 +1,183 @@
+import json
+import os
+import numpy as np
+
+FLUSH_EVERY = 4096
+AVERAGE_CHUNK = 1 << 20
+
+SCHEMA = "schema.json"
+
+class ColumnLog:
+    # Journal en colonnes : les lignes sont rangées dans des tableaux préalloués et écrites
+    # par paquets de capacity lignes à la fin d'un fichier brut par colonne, en ajout seul.
+    # Le schéma (type et forme de chaque colonne) est dans schema.json, pour read_columns.
+
+    def __init__(self, directory, columns, capacity=FLUSH_EVERY):
+        # columns : { nom: (dtype, forme d'une valeur) }
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.directory = directory
+        self.capacity = capacity
+        self.size = 0
+
+        self.columns = {
+            name: np.zeros((capacity,) + tuple(shape), dtype=dtype)
+            for name, (dtype, shape) in columns.items()
+        }
+
+        schema = {
+            name: { "dtype": np.dtype(dtype).str, "shape": list(shape) }
+            for name, (dtype, shape) in columns.items()
+        }
+        schema_path = os.path.join(directory, SCHEMA)
+
+        if os.path.exists(schema_path):
+            with open(schema_path) as f:
+                if json.load(f) != schema:
+                    raise ValueError(f"{directory} already holds a log with other columns")
+        else:
+            with open(schema_path, "w") as f:
+                json.dump(schema, f, indent=2)
+
+    def record(self, **values):
+
+        i = self.size
+
+        for name, value in values.items():
+            self.columns[name][i] = value
+
+        self.size += 1
+
+        if self.size == self.capacity:
+            self.flush()
+
+    def flush(self):
+
+        if self.size == 0:
+            return
+
+        for name, column in self.columns.items():
+            with open(os.path.join(self.directory, name + ".bin"), "ab") as f:
+                column[:self.size].tofile(f)
+
+        self.size = 0
+
+    def close(self):
+        self.flush()
+
+def read_columns(directory):
+    # Colonnes d'un ColumnLog en np.memmap : rien n'est chargé en mémoire avant d'être lu.
+    # Toutes les colonnes sont tronquées au même nombre de lignes complètes.
+
+    with open(os.path.join(directory, SCHEMA)) as f:
+        schema = json.load(f)
+
+    lengths = {}
+    for name, column in schema.items():
+        row_size = np.dtype(column["dtype"]).itemsize * int(np.prod(column["shape"]))
+        path = os.path.join(directory, name + ".bin")
+        lengths[name] = os.path.getsize(path) // row_size if os.path.exists(path) else 0
+
+    rows = min(lengths.values())
+    if rows == 0:
+        return {
+            name: np.zeros((0,) + tuple(column["shape"]), dtype=column["dtype"])
+            for name, column in schema.items()
+        }
+
+    return {
+        name: np.memmap(os.path.join(directory, name + ".bin"), dtype=column["dtype"],
+                        mode="r", shape=(rows,) + tuple(column["shape"]))
+        for name, column in schema.items()
+    }
+
+def moving_average(values, window, start=0, stop=None, chunk=AVERAGE_CHUNK):
+    # Courbe d'apprentissage lissée de values[start:stop], par sommes cumulées calculées bloc
+    # par bloc : d'un memmap, seuls chunk éléments à la fois sont lus et convertis en float,
+    # et seules les window dernières sommes cumulées passent d'un bloc au suivant
+
+    values = np.asarray(values)[start:stop]
+    if len(values) < window:
+        return np.zeros(0)
+
+    averages = np.empty(len(values) - window + 1)
+
+    # sums[k] = somme de values[:base + k]
+    sums = np.zeros(1)
+    base = 0
+
+    for first in range(0, len(values), chunk):
+
+        block = np.cumsum(values[first:first + chunk], dtype=float)
+        block += sums[-1]
+        sums = np.concatenate((sums, block))
+        last = first + len(block)
+
+        # Moyennes des fenêtres qui finissent dans ce bloc
+        low = max(first + 1, window)
+        if low <= last:
+            averages[low - window:last - window + 1] = (
+                sums[low - base:last - base + 1]
+                - sums[low - window - base:last - window - base + 1]) / window
+
+        sums = sums[-window:]
+        base = last + 1 - len(sums)
+
+    return averages
+
+class TrainingMetrics:
+    # Deux journaux dans directory : steps/ (une ligne par décision) et episodes/
+    # (une ligne par épisode terminé, avec son score, sa durée et sa meilleure plateforme)
+
+    def __init__(self, directory, n_actions, capacity=FLUSH_EVERY, step=0, episode=0):
+
+        self.steps = ColumnLog(os.path.join(directory, "steps"), {
+            "step": (np.int64, ()),
+            "action": (np.int8, ()),
+            "reward": (np.float32, ()),
+            "platform": (np.int32, ()),
+            "q_vector": (np.float32, (n_actions,)),
+        }, capacity)
+
+        self.episodes = ColumnLog(os.path.join(directory, "episodes"), {
+            "episode": (np.int64, ()),
+            "end_step": (np.int64, ()),
+            "score": (np.float64, ()),
+            "length": (np.int32, ()),
+            "max_platform": (np.int32, ()),
+        }, max(1, capacity // 64))
+
+        # Numérotation reprise après un checkpoint
+        self.step = step
+        self.episode = episode
+        self.episode_score = 0
+        self.episode_length = 0
+        self.max_platform = 0
+
+    def record(self, action, reward, platform, q_vector, done):
+
+        self.steps.record(step=self.step, action=action, reward=reward,
+                          platform=platform, q_vector=q_vector)
+
+        self.step += 1
+        self.episode_score += reward
+        self.episode_length += 1
+        self.max_platform = max(self.max_platform, platform)
+
+        if done:
+            self.episodes.record(episode=self.episode, end_step=self.step,
+                                 score=self.episode_score, length=self.episode_length,
+                                 max_platform=self.max_platform)
+            self.episode += 1
+            self.episode_score = 0
+            self.episode_length = 0
+            self.max_platform = 0
+
+    def close(self):
+        self.steps.close()
+        self.episodes.close()
+
+def read_metrics(directory):
+    return read_columns(os.path.join(directory, "steps")), \
+        read_columns(os.path.join(directory, "episodes"))
@@ -0,0 +1,132 @@
+import functools
+import json
+import sys
+import time
+from collections import defaultdict
+
+REPORT_EVERY = 1000
+
+# Niveaux de verbosité des messages de debug (Q-vecteurs, ...)
+QUIET = 0
+VERBOSE = 1
+
+class Profiler:
+    # Minuteurs et compteurs nommés autour des étapes chaudes (physique, policy, affichage).
+    # Désactivé, un appel instrumenté ne coûte qu'un test sur self.enabled.
+    # Tous les report_every pas, les moyennes depuis le dernier rapport sont écrites dans output.
+
+    def __init__(self, report_every=REPORT_EVERY, output=None):
+
+        self.enabled = False
+        self.report_every = report_every
+        self.output = output
+
+        self.steps = 0
+        self.totals = defaultdict(int)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+        self.window_totals = defaultdict(int)
+        self.window_calls = defaultdict(int)
+
+    def enable(self, report_every=None, output=None):
+
+        self.enabled = True
+
+        if report_every is not None:
+            self.report_every = report_every
+        if output is not None:
+            self.output = output
+
+    def disable(self):
+        self.enabled = False
+
+    def add_time(self, name, nanoseconds):
+
+        self.totals[name] += nanoseconds
+        self.calls[name] += 1
+        self.window_totals[name] += nanoseconds
+        self.window_calls[name] += 1
+
+    def count(self, name, n=1):
+
+        if self.enabled:
+            self.counters[name] += n
+
+    def step(self):
+        # Un pas de décision : déclenche le rapport périodique
+
+        if not self.enabled:
+            return
+
+        self.steps += 1
+
+        if self.report_every and self.steps % self.report_every == 0:
+            self.report()
+
+    def report(self):
+
+        output = self.output or sys.stderr
+
+        parts = [
+            f"{name} {self.window_totals[name] / self.window_calls[name] / 1e3:.1f}us"
+            f" x{self.window_calls[name]}"
+            for name in sorted(self.window_totals)
+        ]
+        parts += [ f"{name} {value}" for name, value in sorted(self.counters.items()) ]
+
+        print(f"[profile] step {self.steps}: " + ", ".join(parts), file=output)
+
+        self.window_totals.clear()
+        self.window_calls.clear()
+
+    def summary(self):
+
+        return {
+            "steps": self.steps,
+            "timers": {
+                name: {
+                    "calls": self.calls[name],
+                    "total_s": self.totals[name] / 1e9,
+                    "mean_us": self.totals[name] / self.calls[name] / 1e3,
+                }
+                for name in sorted(self.totals)
+            },
+            "counters": dict(self.counters),
+        }
+
+    def export(self, path):
+
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def reset(self):
+
+        self.steps = 0
+        for table in (self.totals, self.calls, self.counters, self.window_totals, self.window_calls):
+            table.clear()
+
+PROFILER = Profiler()
+
+def timed(name, profiler=PROFILER):
+    # Décorateur : chronomètre chaque appel sous name quand profiler est activé
+
+    def decorator(function):
+
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.add_time(name, clock() - start)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,100 @@
+import numpy as np
+from replay_buffer import ReplayBuffer
+from qnetwork import NUMPY, QNetwork
+
+class QLearningPolicy:
+    # Partie commune des Policy du doodle et du labyrinthe : réseau Q, tampon de rejeu et
+    # apprentissage par lots tirés du tampon. Les sous-classes fixent actions,
+    # states_to_dataset et le choix des actions, et chronomètrent train sous leur nom.
+
+    def __init__(self, n_inputs, n_outputs, solver, learning_rate, discount_factor,
+                 replay_capacity, batch_size, train_every, backend, seed, hidden_layer_sizes):
+
+        self.learning_rate = learning_rate
+        self.discount_factor = discount_factor
+        self.backend = backend
+
+        if backend == NUMPY:
+            self.mlp = QNetwork(n_inputs, n_outputs,
+                                hidden_layer_sizes = hidden_layer_sizes,
+                                activation = 'tanh',
+                                solver = solver,
+                                learning_rate_init = learning_rate,
+                                batch_capacity = batch_size,
+                                seed = seed)
+        else:
+            # Import tardif : sklearn coûte plus d'une seconde et seul ce backend en a besoin
+            from sklearn.neural_network import MLPRegressor
+            self.mlp = MLPRegressor(hidden_layer_sizes = hidden_layer_sizes,
+                                    activation = 'tanh',
+                                    solver = solver,
+                                    learning_rate_init = learning_rate,
+                                    max_iter = 1,
+                                    warm_start = True,
+                                    random_state = seed)
+        self.mlp.fit([[0] * n_inputs], [[0] * n_outputs])
+
+        self.replay_buffer = ReplayBuffer(replay_capacity, n_inputs, seed)
+        self.batch_size = batch_size
+        self.train_every = train_every
+        self.steps = 0
+        self.frozen = False
+        self.q_cache = None
+
+    def __repr__(self):
+        return repr(self.q_vector)
+
+    def state_to_dataset(self, state):
+        return self.states_to_dataset([state])
+
+    def remember(self, previous_state, action_id, reward, state, done):
+        # Une transition, et un entraînement tous les train_every pas
+
+        if self.frozen:
+            return
+
+        self.replay_buffer.add(previous_state, action_id, reward, state, done)
+        self.steps += 1
+
+        if self.steps % self.train_every == 0 and len(self.replay_buffer) >= self.batch_size:
+            self.train()
+
+    def update_batch(self, states, action_ids, rewards, next_states, dones):
+        # Transitions d'un lot (autres processus, parties en parallèle), actions en indices :
+        # autant d'entraînements que si elles étaient arrivées une par une
+
+        if self.frozen:
+            return
+
+        self.replay_buffer.add_batch(states, action_ids, rewards, next_states, dones)
+
+        steps = self.steps + len(action_ids)
+        trainings = steps // self.train_every - self.steps // self.train_every
+        self.steps = steps
+
+        if len(self.replay_buffer) >= self.batch_size:
+            for _ in range(trainings):
+                self.train()
+
+    def get_weights(self):
+        return [ np.copy(p) for p in self.mlp.coefs_ + self.mlp.intercepts_ ]
+
+    def set_weights(self, weights):
+        for p, w in zip(self.mlp.coefs_ + self.mlp.intercepts_, weights):
+            p[...] = w
+        self.q_cache = None
+
+    def train(self):
+        #Q(st, at) = Q(st, at) + learning_rate * (reward + discount_factor * max(Q(state)) - Q(st, at))
+        states, actions, rewards, next_states, dones = self.replay_buffer.sample(self.batch_size)
+
+        inputs = self.states_to_dataset(states)
+        q_vectors = self.mlp.predict(inputs)
+        maxQ = np.amax(self.mlp.predict(self.states_to_dataset(next_states)), axis=1)
+
+        rows = np.arange(len(actions))
+        targets = rewards + self.discount_factor * maxQ * ~dones
+        q_vectors[rows, actions] += self.learning_rate * (targets - q_vectors[rows, actions])
+
+        self.mlp.partial_fit(inputs, q_vectors)
+        self.q_cache = None
@@ -0,0 +1,62 @@
+import numpy as np
+
+class QCache:
+    # Q-valeurs d'une policy figée précalculées sur une grille d'états : bins[d] valeurs
+    # régulièrement espacées entre lows[d] et highs[d], bornes comprises, pour chaque
+    # dimension d de l'état. Un état est ramené au point de grille le plus proche.
+    # Avec des entiers consécutifs pour grille (cases du labyrinthe), le cache est exact.
+
+    def __init__(self, policy, lows, highs, bins):
+
+        self.lows = np.asarray(lows, dtype=float)
+        self.highs = np.asarray(highs, dtype=float)
+        self.bins = np.asarray(bins, dtype=np.intp)
+
+        steps = (self.highs - self.lows) / np.maximum(self.bins - 1, 1)
+        self.scales = np.where(steps > 0, 1 / np.where(steps > 0, steps, 1), 0)
+
+        # Indice à plat d'un point de grille : somme des indices par dimension fois ces pas
+        self.strides = np.ones(len(self.bins), dtype=np.intp)
+        for d in range(len(self.bins) - 2, -1, -1):
+            self.strides[d] = self.strides[d + 1] * self.bins[d + 1]
+
+        axes = [ np.linspace(low, high, n) for low, high, n in zip(self.lows, self.highs, self.bins) ]
+        grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, len(self.bins))
+
+        self.q_table = policy.mlp.predict(policy.states_to_dataset(grid))
+        self.best = np.argmax(self.q_table, axis=1)
+
+        # Copies Python pour la recherche d'un seul état, sans passer par NumPy
+        self.py_lows = self.lows.tolist()
+        self.py_scales = self.scales.tolist()
+        self.py_maxima = (self.bins - 1).tolist()
+        self.py_strides = self.strides.tolist()
+        self.py_best = self.best.tolist()
+
+    def index(self, state):
+
+        flat = 0
+
+        for value, low, scale, maximum, stride in zip(state, self.py_lows, self.py_scales,
+                                                      self.py_maxima, self.py_strides):
+            i = int((value - low) * scale + 0.5)
+            flat += stride * min(max(i, 0), maximum)
+
+        return flat
+
+    def indices(self, states):
+
+        states = np.asarray(states, dtype=float)
+        indices = np.floor((states - self.lows) * self.scales + 0.5).astype(np.intp)
+        np.clip(indices, 0, self.bins - 1, out=indices)
+
+        return indices @ self.strides
+
+    def lookup(self, state):
+        # (indice de la meilleure action, Q-vecteur) pour un état
+        i = self.index(state)
+        return self.py_best[i], self.q_table[i]
+
+    def lookup_batch(self, states):
+        indices = self.indices(states)
+        return self.best[indices], self.q_table[indices]
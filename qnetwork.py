@@ -0,0 +1,237 @@
+import time
+import numpy as np
+
+SKLEARN = "sklearn"
+NUMPY = "numpy"
+BACKENDS = [ SKLEARN, NUMPY ]
+
+class QNetwork:
+    # Perceptron multicouche en NumPy avec la même interface que MLPRegressor
+    # (predict, fit, partial_fit, coefs_, intercepts_) et les mêmes règles de calcul :
+    # perte quadratique, régularisation L2 alpha, Adam ou SGD avec moment de Nesterov.
+    # Tous les tampons (activations, gradients, état de l'optimiseur) sont alloués à l'avance.
+
+    def __init__(self, n_inputs, n_outputs,
+                 hidden_layer_sizes = (2,),
+                 activation = 'tanh',
+                 solver = 'adam',
+                 learning_rate_init = 0.001,
+                 alpha = 0.0001,
+                 momentum = 0.9,
+                 beta_1 = 0.9,
+                 beta_2 = 0.999,
+                 epsilon = 1e-8,
+                 batch_capacity = 1,
+                 seed = None):
+
+        if activation not in ('tanh', 'relu'):
+            raise ValueError(f"Unsupported activation: {activation}")
+        if solver not in ('adam', 'sgd'):
+            raise ValueError(f"Unsupported solver: {solver}")
+
+        self.activation = activation
+        self.solver = solver
+        self.learning_rate_init = learning_rate_init
+        self.alpha = alpha
+        self.momentum = momentum
+        self.beta_1 = beta_1
+        self.beta_2 = beta_2
+        self.epsilon = epsilon
+
+        self.layer_sizes = [ n_inputs, *hidden_layer_sizes, n_outputs ]
+        self.random = np.random.default_rng(seed)
+
+        self.coefs_ = []
+        self.intercepts_ = []
+
+        for fan_in, fan_out in zip(self.layer_sizes[:-1], self.layer_sizes[1:]):
+            # Initialisation de Glorot, comme sklearn
+            bound = np.sqrt(6 / (fan_in + fan_out))
+            self.coefs_.append(self.random.uniform(-bound, bound, (fan_in, fan_out)))
+            self.intercepts_.append(self.random.uniform(-bound, bound, fan_out))
+
+        self.params = self.coefs_ + self.intercepts_
+        self.grads = [ np.zeros_like(p) for p in self.params ]
+        self.scratch = [ np.zeros_like(p) for p in self.params ]
+
+        # Moments d'Adam, ou vitesses pour SGD
+        self.first_moments = [ np.zeros_like(p) for p in self.params ]
+        self.second_moments = [ np.zeros_like(p) for p in self.params ]
+        self.t = 0
+
+        self.allocate(batch_capacity)
+
+    def allocate(self, batch_capacity):
+
+        self.batch_capacity = batch_capacity
+        self.activations = [ np.zeros((batch_capacity, size)) for size in self.layer_sizes ]
+        self.deltas = [ np.zeros((batch_capacity, size)) for size in self.layer_sizes[1:] ]
+
+    def forward(self, X):
+
+        n = len(X)
+
+        if n > self.batch_capacity:
+            self.allocate(n)
+
+        activations = self.activations
+        activations[0][:n] = X
+
+        last = len(self.coefs_) - 1
+
+        for i, (coef, intercept) in enumerate(zip(self.coefs_, self.intercepts_)):
+
+            out = activations[i + 1][:n]
+            np.matmul(activations[i][:n], coef, out=out)
+            out += intercept
+
+            if i < last:
+                if self.activation == 'tanh':
+                    np.tanh(out, out=out)
+                else:
+                    np.maximum(out, 0, out=out)
+
+        return activations[-1][:n]
+
+    def predict(self, X):
+        return self.forward(np.asarray(X, dtype=float)).copy()
+
+    def backward(self, y):
+
+        n = len(y)
+        layers = len(self.coefs_)
+
+        delta = self.deltas[-1][:n]
+        np.subtract(self.activations[-1][:n], y, out=delta)
+
+        for i in range(layers - 1, -1, -1):
+
+            coef_grad = self.grads[i]
+            np.matmul(self.activations[i][:n].T, delta, out=coef_grad)
+            coef_grad += self.alpha * self.coefs_[i]
+            coef_grad /= n
+
+            np.mean(delta, axis=0, out=self.grads[layers + i])
+
+            if i > 0:
+                previous = self.deltas[i - 1][:n]
+                np.matmul(delta, self.coefs_[i].T, out=previous)
+
+                activation = self.activations[i][:n]
+                if self.activation == 'tanh':
+                    previous *= 1 - activation ** 2
+                else:
+                    previous[activation <= 0] = 0
+
+                delta = previous
+
+    def step(self):
+
+        self.t += 1
+
+        if self.solver == 'adam':
+
+            learning_rate = (self.learning_rate_init
+                             * np.sqrt(1 - self.beta_2 ** self.t) / (1 - self.beta_1 ** self.t))
+
+            for param, grad, m, v, scratch in zip(self.params, self.grads, self.first_moments,
+                                                  self.second_moments, self.scratch):
+                m *= self.beta_1
+                np.multiply(grad, 1 - self.beta_1, out=scratch)
+                m += scratch
+                v *= self.beta_2
+                np.multiply(grad, grad, out=scratch)
+                scratch *= 1 - self.beta_2
+                v += scratch
+
+                np.sqrt(v, out=scratch)
+                scratch += self.epsilon
+                np.divide(m, scratch, out=scratch)
+                scratch *= learning_rate
+                param -= scratch
+
+        else:
+
+            for param, grad, velocity, scratch in zip(self.params, self.grads, self.first_moments,
+                                                      self.scratch):
+                velocity *= self.momentum
+                np.multiply(grad, self.learning_rate_init, out=scratch)
+                velocity -= scratch
+
+                # Nesterov : on applique momentum * velocity - learning_rate * grad
+                param -= scratch
+                np.multiply(velocity, self.momentum, out=scratch)
+                param += scratch
+
+    def partial_fit(self, X, y):
+
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+
+        self.forward(X)
+        self.backward(y)
+        self.step()
+
+        return self
+
+    def fit(self, X, y):
+        # max_iter = 1 et warm_start = True dans les deux scripts : une seule passe
+        return self.partial_fit(X, y)
+
+def benchmark(mlp, n_inputs, n_outputs, batch_size, decisions):
+
+    random = np.random.default_rng(0)
+    state = random.random((1, n_inputs))
+    states = random.random((batch_size, n_inputs))
+    targets = random.random((batch_size, n_outputs))
+
+    start = time.perf_counter()
+    for _ in range(decisions):
+        mlp.predict(state)
+    predict_latency = (time.perf_counter() - start) / decisions
+
+    start = time.perf_counter()
+    for _ in range(decisions):
+        mlp.partial_fit(states, targets)
+    fit_latency = (time.perf_counter() - start) / decisions
+
+    return predict_latency, fit_latency
+
+if __name__ == "__main__":
+
+    import warnings
+    from sklearn.neural_network import MLPRegressor
+
+    warnings.simplefilter("ignore")
+
+    # Réseaux de doodle.py et de maze5AL1-arcade-ann.py (petit pas pour que SGD ne diverge pas)
+    configurations = [
+        ("doodle", 2, 3, (2,), 'adam', 0.001),
+        ("maze", 2, 4, (8,), 'sgd', 0.001),
+    ]
+
+    batch_size = 128
+    decisions = 2000
+
+    for name, n_inputs, n_outputs, hidden_layer_sizes, solver, learning_rate in configurations:
+
+        mlp = MLPRegressor(hidden_layer_sizes = hidden_layer_sizes,
+                           activation = 'tanh',
+                           solver = solver,
+                           learning_rate_init = learning_rate,
+                           max_iter = 1,
+                           warm_start = True)
+        mlp.fit(np.zeros((1, n_inputs)), np.zeros((1, n_outputs)))
+
+        network = QNetwork(n_inputs, n_outputs,
+                           hidden_layer_sizes = hidden_layer_sizes,
+                           activation = 'tanh',
+                           solver = solver,
+                           learning_rate_init = learning_rate,
+                           batch_capacity = batch_size)
+
+        for backend, q_function in ((SKLEARN, mlp), (NUMPY, network)):
+            predict_latency, fit_latency = benchmark(q_function, n_inputs, n_outputs,
+                                                     batch_size, decisions)
+            print(f"{name:6} {backend:7} predict {predict_latency * 1e6:8.1f} us   "
+                  f"partial_fit({batch_size}) {fit_latency * 1e6:8.1f} us")
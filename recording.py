@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import doodle_sim
+import maze_sim
+from games import GAME_DOODLE, GAME_MAZE
+
+# Les deux jeux ont au plus 4 actions : 2 bits par décision, 4 décisions par octet
+BITS_PER_ACTION = 2
+ACTIONS_PER_BYTE = 8 // BITS_PER_ACTION
+
+def pack_actions(action_ids):
+
+    action_ids = np.asarray(action_ids, dtype=np.uint8)
+    padded = np.zeros(-(-len(action_ids) // ACTIONS_PER_BYTE) * ACTIONS_PER_BYTE, dtype=np.uint8)
+    padded[:len(action_ids)] = action_ids
+
+    shifts = np.arange(ACTIONS_PER_BYTE, dtype=np.uint8) * BITS_PER_ACTION
+    return np.bitwise_or.reduce(padded.reshape(-1, ACTIONS_PER_BYTE) << shifts, axis=1)
+
+def unpack_actions(packed, count):
+
+    shifts = np.arange(ACTIONS_PER_BYTE, dtype=np.uint8) * BITS_PER_ACTION
+    action_ids = (np.asarray(packed, dtype=np.uint8)[:, None] >> shifts) & ((1 << BITS_PER_ACTION) - 1)
+
+    return action_ids.ravel()[:count]
+
+def capture_doodle(simulation):
+    # État de départ d'un épisode doodle : le joueur et la plateforme courante
+
+    player = simulation.player
+
+    return {
+        "center_x": player.center_x,
+        "center_y": player.center_y,
+        "change_x": player.change_x,
+        "change_y": player.change_y,
+        "texture": player.texture,
+        "current_height": simulation.current_height,
+        "current_platform_index": simulation.current_platform_index,
+    }
+
+def restore_doodle(simulation, state):
+
+    player = simulation.player
+
+    player.center_x = state["center_x"]
+    player.center_y = state["center_y"]
+    player.change_x = state["change_x"]
+    player.change_y = state["change_y"]
+    player.texture = state["texture"]
+    simulation.current_height = state["current_height"]
+    simulation.current_platform_index = state["current_platform_index"]
+
+class Recording:
+    # Un épisode : de quoi reconstruire l'environnement (meta), son état de départ, les actions
+    # de chaque décision sur 2 bits et, en option, les Q-vecteurs en float16.
+    # Rejouer un Recording n'a besoin que de la simulation, jamais de la Policy.
+
+    def __init__(self, game, meta, initial_state, action_ids, q_vectors=None, result=None):
+
+        self.game = game
+        self.meta = meta
+        self.initial_state = initial_state
+        self.action_ids = np.asarray(action_ids, dtype=np.uint8)
+        self.q_vectors = q_vectors
+        self.result = result or {}
+
+    def __len__(self):
+        return len(self.action_ids)
+
+    def save(self, path):
+
+        header = {
+            "game": self.game,
+            "meta": self.meta,
+            "initial_state": self.initial_state,
+            "decisions": len(self.action_ids),
+            "result": self.result,
+        }
+
+        arrays = { "header": np.array(json.dumps(header)), "actions": pack_actions(self.action_ids) }
+        if self.q_vectors is not None:
+            arrays["q_vectors"] = np.asarray(self.q_vectors, dtype=np.float16)
+
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+
+        with np.load(path) as recording:
+            header = json.loads(recording["header"].item())
+            action_ids = unpack_actions(recording["actions"], header["decisions"])
+            q_vectors = recording["q_vectors"] if "q_vectors" in recording.files else None
+
+        return cls(header["game"], header["meta"], header["initial_state"], action_ids,
+                   q_vectors, header["result"])
+
+    def environment(self):
+        # Environnement remis dans l'état de départ de l'épisode
+
+        if self.game == GAME_DOODLE:
+            meta = self.meta
+            simulation = doodle_sim.Simulation(seed=meta["seed"], infinite=meta["infinite"],
+                                               ticks_per_decision=meta["ticks_per_decision"],
+                                               next_platform_reward=meta["next_platform_reward"],
+                                               dead_reward=meta["dead_reward"])
+            restore_doodle(simulation, self.initial_state)
+            return simulation
+
+        return maze_sim.Environment(self.meta["layout"])
+
+    def actions(self):
+
+        if self.game == GAME_DOODLE:
+            return [ doodle_sim.ACTIONS[i] for i in self.action_ids.tolist() ]
+
+        return [ maze_sim.ACTIONS[i] for i in self.action_ids.tolist() ]
+
+class EpisodeRecorder:
+    # Enregistre les décisions d'un épisode dans des tableaux agrandis par doublement.
+    # start() fixe l'état de départ (appelé à la création), record() ajoute une décision,
+    # finish() renvoie le Recording, l'écrit dans directory s'il y en a un, et l'appelant
+    # relance start() pour l'épisode suivant.
+
+    def __init__(self, game, environment, state=None, directory=None, q_vectors=False,
+                 capacity=1024):
+
+        self.game = game
+        self.directory = directory
+        self.episodes = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        if game == GAME_DOODLE:
+            if environment.seed is None:
+                raise ValueError("a level built from explicit coordinates cannot be recorded")
+            self.meta = {
+                "seed": environment.seed,
+                "infinite": environment.level_platforms_coordinates is None,
+                "ticks_per_decision": environment.ticks_per_decision,
+                "next_platform_reward": environment.next_platform_reward,
+                "dead_reward": environment.dead_reward,
+            }
+            n_actions = len(doodle_sim.ACTIONS)
+        else:
+            self.meta = { "layout": layout_text(environment) }
+            n_actions = len(maze_sim.ACTIONS)
+
+        self.action_ids = np.zeros(capacity, dtype=np.uint8)
+        self.q_vectors = np.zeros((capacity, n_actions), dtype=np.float16) if q_vectors else None
+        self.size = 0
+        self.score = 0
+        self.start(environment, state)
+
+    def start(self, environment, state=None):
+
+        if self.game == GAME_DOODLE:
+            self.initial_state = capture_doodle(environment)
+        else:
+            self.initial_state = { "state": list(state) }
+
+        self.size = 0
+        self.score = 0
+
+    def record(self, action_id, reward, q_vector=None):
+        # q_vector n'est gardé que si le recorder a été créé avec q_vectors=True
+
+        if self.size == len(self.action_ids):
+            self.action_ids = np.resize(self.action_ids, 2 * self.size)
+            if self.q_vectors is not None:
+                self.q_vectors = np.resize(self.q_vectors, (2 * self.size, self.q_vectors.shape[1]))
+
+        self.action_ids[self.size] = action_id
+        if self.q_vectors is not None:
+            self.q_vectors[self.size] = q_vector
+
+        self.size += 1
+        self.score += reward
+
+    def finish(self, **result):
+
+        recording = Recording(self.game, self.meta, self.initial_state,
+                              self.action_ids[:self.size].copy(),
+                              self.q_vectors[:self.size].copy() if self.q_vectors is not None else None,
+                              dict(result, score=float(self.score)))
+
+        if self.directory is not None:
+            recording.save(os.path.join(self.directory, f"episode-{self.episodes:08d}.npz"))
+        self.episodes += 1
+
+        return recording
+
+def layout_text(environment):
+    return "\n".join(bytes(row[row != maze_sim.NO_TILE]).decode("ascii")
+                     for row in environment.tiles)
+
+def replay(recording):
+    # Rejoue l'épisode sans fenêtre, aussi vite que possible.
+    # Renvoie le score, la dernière plateforme atteinte (ou la dernière case) et le nombre de décisions.
+
+    environment = recording.environment()
+    score = 0
+
+    if recording.game == GAME_DOODLE:
+        platform = environment.current_platform_index
+        for action in recording.actions():
+            _state, reward, done = environment.step(action)
+            score += reward
+            if not done:
+                platform = environment.current_platform_index
+        return score, platform, len(recording)
+
+    state = tuple(recording.initial_state["state"])
+    for action in recording.actions():
+        state, reward = environment.apply(state, action)
+        score += reward
+
+    return score, state, len(recording)
+
+class ReplayAgent:
+    # Remplace l'Agent d'une fenêtre : joue les actions enregistrées, n'apprend rien.
+    # Une fois l'enregistrement fini, ne fait plus rien (doodle) ou reste sur place (labyrinthe).
+
+    def __init__(self, recording, environment):
+
+        self.recording = recording
+        self.environment = environment
+        self.actions = recording.actions()
+        self.position = 0
+        self.score = 0
+        self.episodes = 0
+        self.policy = None
+
+        if recording.game == GAME_MAZE:
+            self.state = tuple(recording.initial_state["state"])
+
+    def best_action(self):
+
+        if self.position >= len(self.actions):
+            return doodle_sim.ACTION_NOTHING if self.recording.game == GAME_DOODLE else None
+
+        action = self.actions[self.position]
+        self.position += 1
+
+        return action
+
+    def learn(self, action, new_state, reward, done=False):
+        self.score += reward
+
+    # Interface de maze_sim.Agent utilisée par MazeWindow
+
+    def do(self, action):
+        if action is not None:
+            self.state, reward = self.environment.apply(self.state, action)
+            self.score += reward
+
+    def update_policy(self):
+        pass
+
+    def reset(self):
+        self.state = tuple(self.recording.initial_state["state"])
+        self.position = 0
+        self.score = 0
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recordings", nargs="+", help="fichiers .npz ou dossiers d'enregistrements")
+    args = parser.parse_args()
+
+    paths = []
+    for path in args.recordings:
+        if os.path.isdir(path):
+            paths += sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.endswith(".npz"))
+        else:
+            paths.append(path)
+
+    start = time.perf_counter()
+    decisions = 0
+    mismatches = 0
+
+    for path in paths:
+        recording = Recording.load(path)
+        score, _last, length = replay(recording)
+        decisions += length
+        if "score" in recording.result and score != recording.result["score"]:
+            mismatches += 1
+            print(f"{path}: replayed score {score}, recorded {recording.result['score']}")
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(paths)} recordings, {decisions} decisions replayed in {elapsed:.2f}s, "
+          f"{mismatches} mismatches")
@@ -0,0 +1,60 @@
+import numpy as np
+
+class ReplayBuffer:
+    # Tampon circulaire de transitions (state, action, reward, next_state, done)
+    # dans des tableaux alloués une seule fois.
+
+    def __init__(self, capacity, state_size, seed=None):
+
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_size))
+        self.actions = np.zeros(capacity, dtype=np.intp)
+        self.rewards = np.zeros(capacity)
+        self.next_states = np.zeros((capacity, state_size))
+        self.dones = np.zeros(capacity, dtype=bool)
+
+        self.position = 0
+        self.size = 0
+        self.random = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+
+        i = self.position
+
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+
+        n = len(actions)
+        indices = (self.position + np.arange(n)) % self.capacity
+
+        self.states[indices] = states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.next_states[indices] = next_states
+        self.dones[indices] = dones
+
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, batch_size):
+
+        indices = self.random.integers(0, self.size, batch_size)
+
+        return (
+            self.states[indices],
+            self.actions[indices],
+            self.rewards[indices],
+            self.next_states[indices],
+            self.dones[indices]
+        )
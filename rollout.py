@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+import queue
+import time
+import numpy as np
+from doodle_sim import Simulation, Policy
+from level_bank import LevelBank
+
+STEPS_PER_CHUNK = 256
+SYNC_EVERY = 4096
+# Secondes d'attente d'un paquet avant de vérifier que les workers sont vivants
+WORKER_POLL = 1
+
+def rollout_worker(seed, backend, transitions, weights, steps_per_chunk, bank=None,
+                   features=None):
+    # Processus de collecte : joue avec une copie de la Policy du learner et lui envoie
+    # ses transitions par paquets de steps_per_chunk. Avec bank, le niveau est le niveau
+    # seed de la banque, partagée entre processus au lieu d'être régénéré dans chacun.
+    # features est le StateFeatures du learner (None pour l'état de get_state).
+
+    if bank is not None:
+        bank = LevelBank.open(bank)
+        environment = bank.simulation(seed % len(bank), features=features)
+    else:
+        environment = Simulation(seed=seed, features=features)
+    policy = Policy(backend=backend, seed=seed, features=features)
+    state_size = 2 if features is None else features.size
+
+    state = environment.reset()
+    score = 0
+
+    while True:
+
+        # Récupérer les derniers poids publiés, None demande l'arrêt
+        try:
+            while True:
+                latest = weights.get_nowait()
+                if latest is None:
+                    return
+                policy.set_weights(latest)
+        except queue.Empty:
+            pass
+
+        # Nouveaux tableaux à chaque paquet : Queue.put les sérialise plus tard, dans un thread
+        states = np.zeros((steps_per_chunk, state_size))
+        actions = np.zeros(steps_per_chunk, dtype=np.intp)
+        rewards = np.zeros(steps_per_chunk)
+        next_states = np.zeros((steps_per_chunk, state_size))
+        dones = np.zeros(steps_per_chunk, dtype=bool)
+        scores = []
+
+        for i in range(steps_per_chunk):
+
+            action = policy.best_action(state)
+            next_state, reward, done = environment.step(action)
+
+            states[i] = state
+            actions[i] = action
+            rewards[i] = reward
+            next_states[i] = next_state
+            dones[i] = done
+
+            score += reward
+            if done:
+                scores.append(score)
+                score = 0
+
+            state = next_state
+
+        transitions.put((seed, states, actions, rewards, next_states, dones, scores))
+
+def train_parallel(policy, steps, workers=None, seed=0,
+                   steps_per_chunk=STEPS_PER_CHUNK, sync_every=SYNC_EVERY, backend=None,
+                   bank=None):
+    # Learner central : entraîne policy avec les transitions de workers processus,
+    # chacun sur son propre niveau, et leur renvoie les poids tous les sync_every pas.
+
+    if workers is None:
+        workers = os.cpu_count()
+    if backend is None:
+        backend = policy.backend
+
+    transitions = multiprocessing.Queue(maxsize=4 * workers)
+    weights = [ multiprocessing.Queue() for _ in range(workers) ]
+
+    processes = [
+        multiprocessing.Process(target=rollout_worker,
+                                args=(seed + i, backend, transitions, weights[i], steps_per_chunk, bank,
+                                      policy.features),
+                                daemon=True)
+        for i in range(workers)
+    ]
+
+    for w in weights:
+        w.put(policy.get_weights())
+    for p in processes:
+        p.start()
+
+    received = 0
+    last_sync = 0
+    scores = []
+
+    try:
+        while received < steps:
+
+            try:
+                chunk = transitions.get(timeout=WORKER_POLL)
+            except queue.Empty:
+                # Un worker mort n'enverra plus rien : ne pas l'attendre indéfiniment
+                for i, p in enumerate(processes):
+                    if p.exitcode is not None:
+                        raise RuntimeError(f"rollout worker {i} (seed {seed + i}) exited "
+                                           f"with code {p.exitcode}")
+                continue
+
+            _seed, states, actions, rewards, next_states, dones, chunk_scores = chunk
+
+            policy.update_batch(states, actions, rewards, next_states, dones)
+            received += len(actions)
+            scores.extend(chunk_scores)
+
+            if received - last_sync >= sync_every:
+                last_sync = received
+                current = policy.get_weights()
+                for w in weights:
+                    w.put(current)
+
+    finally:
+        for w in weights:
+            w.put(None)
+
+        # Vider la file pour que les workers bloqués sur put puissent s'arrêter
+        deadline = time.time() + 5
+        while any(p.is_alive() for p in processes) and time.time() < deadline:
+            try:
+                transitions.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+        for p in processes:
+            p.join(timeout=1)
+            if p.is_alive():
+                p.terminate()
+
+    return received, scores
+
+if __name__ == "__main__":
+
+    from qnetwork import NUMPY
+
+    policy = Policy(backend=NUMPY)
+
+    steps = 200000
+    start = time.perf_counter()
+    received, scores = train_parallel(policy, steps)
+    elapsed = time.perf_counter() - start
+
+    print(f"{received} transitions from {os.cpu_count()} workers in {elapsed:.2f}s "
+          f"({received / elapsed:.0f} transitions/s), {len(scores)} episodes")
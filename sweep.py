@@ -0,0 +1,217 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+import warnings
+import numpy as np
+import doodle_sim
+import maze_sim
+from games import GAME_DOODLE, GAME_MAZE, GAMES
+
+RUNGS = 4
+STEPS_PER_RUNG = 2500
+KEEP_FRACTION = 0.5
+
+# Espaces de recherche par défaut : paramètre -> valeurs essayées
+SPACES = {
+    GAME_DOODLE: {
+        "learning_rate": [ 0.001, 0.01, 0.1, 1 ],
+        "discount_factor": [ 0.5, 0.9, 0.99 ],
+        "decision_timeout": [ 0.05, 0.1, 0.2 ],
+        "next_platform_reward": [ 10, 50, 100 ],
+        "dead_reward": [ -50, -200 ],
+        "hidden_layer_sizes": [ [2], [8], [16, 16] ],
+    },
+    GAME_MAZE: {
+        "learning_rate": [ 0.001, 0.01, 0.1 ],
+        "discount_factor": [ 0.5, 0.9, 0.99 ],
+        "hidden_layer_sizes": [ [8], [32], [32, 32] ],
+    },
+}
+
+class Trial:
+    # Un jeu de paramètres, son environnement et son agent, entraînés par paliers (rungs).
+    # L'objet entier passe d'un processus à l'autre entre deux paliers.
+
+    def __init__(self, trial_id, game, params, seed):
+
+        self.trial_id = trial_id
+        self.game = game
+        self.params = params
+        self.scores = []
+        self.steps = 0
+        self.pruned = False
+
+        hidden_layer_sizes = tuple(params.get("hidden_layer_sizes", ()))
+        policy_params = {
+            name: params[name] for name in ("learning_rate", "discount_factor") if name in params
+        }
+        if hidden_layer_sizes:
+            policy_params["hidden_layer_sizes"] = hidden_layer_sizes
+
+        if game == GAME_DOODLE:
+            simulation_params = {
+                name: params[name] for name in ("next_platform_reward", "dead_reward")
+                if name in params
+            }
+            if "decision_timeout" in params:
+                simulation_params["ticks_per_decision"] = max(1, round(params["decision_timeout"]
+                                                                       * doodle_sim.FRAME_RATE))
+
+            self.environment = doodle_sim.Simulation(seed=seed, **simulation_params)
+            self.agent = doodle_sim.Agent(self.environment,
+                                          doodle_sim.Policy(seed=seed, **policy_params))
+
+        else:
+            self.environment = maze_sim.Environment(maze_sim.MAZE)
+            self.agent = maze_sim.Agent(self.environment, maze_sim.Policy(
+                maze_sim.ACTIONS, self.environment.width, self.environment.height,
+                seed=seed, **policy_params))
+
+    def run(self, steps):
+        # Entraîne steps décisions et ajoute à scores la récompense moyenne par décision
+
+        if self.game == GAME_DOODLE:
+            score = self.agent.score
+            doodle_sim.train(self.environment, self.agent, steps)
+            total = self.agent.score - score
+
+        else:
+            # Même boucle que la fenêtre du labyrinthe, qui recommence à la sortie
+            agent = self.agent
+            total = 0
+            for _ in range(steps):
+                if agent.state == self.environment.goal:
+                    agent.reset()
+                agent.do(agent.best_action())
+                agent.update_policy()
+                total += agent.reward
+
+        self.steps += steps
+        score = total / steps
+
+        # Une policy qui a divergé ne doit pas passer devant les autres
+        if not np.isfinite(score):
+            score = -np.inf
+
+        self.scores.append(score)
+
+def run_rung(arguments):
+
+    trial, steps = arguments
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        with np.errstate(all="ignore"):
+            try:
+                trial.run(steps)
+            except ValueError:
+                # MLPRegressor refuse de continuer sur des poids non finis
+                trial.scores.append(-np.inf)
+
+    return trial
+
+def search_space(game, path=None):
+
+    if path is None:
+        return SPACES[game]
+
+    with open(path) as f:
+        return json.load(f)
+
+def sample_params(space, trials, seed):
+    # Toute la grille si elle a au plus trials points, sinon trials points tirés sans remise
+
+    names = sorted(space)
+    grid = list(itertools.product(*(space[name] for name in names)))
+
+    if trials is not None and trials < len(grid):
+        grid = random.Random(seed).sample(grid, trials)
+
+    return [ dict(zip(names, values)) for values in grid ]
+
+def sweep(game, space, trials=None, rungs=RUNGS, steps_per_rung=STEPS_PER_RUNG,
+          keep_fraction=KEEP_FRACTION, workers=None, seed=0):
+    # Successive halving : toutes les trials s'entraînent un palier de steps_per_rung décisions
+    # dans un pool de workers processus, seule la meilleure fraction keep_fraction (selon la
+    # récompense moyenne du palier) continue au palier suivant, les autres sont arrêtées.
+    # Renvoie toutes les trials, la meilleure en premier.
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    active = [
+        Trial(i, game, params, seed)
+        for i, params in enumerate(sample_params(space, trials, seed))
+    ]
+    finished = []
+
+    with multiprocessing.Pool(workers) as pool:
+
+        for rung in range(rungs):
+
+            active = pool.map(run_rung, [ (trial, steps_per_rung) for trial in active ],
+                              chunksize=1)
+
+            if rung == rungs - 1:
+                break
+
+            active.sort(key=lambda trial: trial.scores[-1], reverse=True)
+            keep = max(1, int(np.ceil(len(active) * keep_fraction)))
+
+            for trial in active[keep:]:
+                trial.pruned = True
+            finished += active[keep:]
+            active = active[:keep]
+
+    finished += active
+
+    # Classement : le palier le plus haut atteint, puis la dernière récompense moyenne
+    finished.sort(key=lambda trial: (len(trial.scores), trial.scores[-1]), reverse=True)
+
+    return finished
+
+def write_results(path, trials):
+
+    names = sorted({ name for trial in trials for name in trial.params })
+
+    with open(path, "w") as f:
+        f.write("\t".join([ "rank", "trial", *names, "rungs", "steps", "score", "pruned" ]) + "\n")
+        for rank, trial in enumerate(trials, 1):
+            values = [ json.dumps(trial.params.get(name)) for name in names ]
+            f.write("\t".join([ str(rank), str(trial.trial_id), *values, str(len(trial.scores)),
+                                str(trial.steps), f"{trial.scores[-1]:.3f}",
+                                str(trial.pruned) ]) + "\n")
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--game", choices=GAMES, default=GAME_DOODLE)
+    parser.add_argument("--space", metavar="JSON", default=None,
+                        help="espace de recherche { paramètre: [valeurs] }, sinon SPACES[game]")
+    parser.add_argument("--trials", type=int, default=None,
+                        help="nombre de points tirés dans la grille (toute la grille par défaut)")
+    parser.add_argument("--rungs", type=int, default=RUNGS)
+    parser.add_argument("--steps", type=int, default=STEPS_PER_RUNG, help="décisions par palier")
+    parser.add_argument("--keep", type=float, default=KEEP_FRACTION,
+                        help="part des trials gardées à chaque palier")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", metavar="PATH", default="sweep.tsv")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+
+    start = time.perf_counter()
+    results = sweep(args.game, search_space(args.game, args.space), args.trials, args.rungs,
+                    args.steps, args.keep, args.workers, args.seed)
+    elapsed = time.perf_counter() - start
+
+    write_results(args.output, results)
+
+    for rank, trial in enumerate(results[:10], 1):
+        print(f"{rank:3} {trial.scores[-1]:10.3f} rungs {len(trial.scores)}  {trial.params}")
+    print(f"{len(results)} trials in {elapsed:.1f}s, results in {args.output}")
@@ -0,0 +1,60 @@
+import sys
+import threading
+import time
+import traceback
+
+SNAPSHOT_INTERVAL = 1 / 30
+VIEWER_FPS = 30
+
+class BackgroundTrainer(threading.Thread):
+    # Entraîne dans un thread séparé, sans attendre l'affichage : step() fait avancer
+    # l'entraînement d'une décision, snapshot() copie ce qu'il faut pour dessiner.
+    # La fenêtre ne lit que self.latest, remplacé au plus tous les snapshot_interval secondes.
+    # Si step() lève une exception, le thread l'affiche sur stderr, la garde dans self.error
+    # et s'arrête : la fenêtre doit la voir et se fermer sans sauvegarder.
+
+    def __init__(self, step, snapshot, snapshot_interval=SNAPSHOT_INTERVAL):
+
+        super().__init__(daemon=True)
+
+        self.step = step
+        self.snapshot = snapshot
+        self.snapshot_interval = snapshot_interval
+
+        self.steps = 0
+        self.latest = snapshot()
+        self.error = None
+        self.stopping = threading.Event()
+
+    def run(self):
+
+        clock = time.perf_counter
+        next_snapshot = clock()
+
+        while not self.stopping.is_set():
+
+            try:
+                self.step()
+            except Exception as error:
+                self.error = error
+                print("Background training stopped:", file=sys.stderr)
+                traceback.print_exc()
+                return
+
+            self.steps += 1
+
+            now = clock()
+            if now >= next_snapshot:
+                self.latest = self.snapshot()
+                next_snapshot = now + self.snapshot_interval
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+    def stop(self):
+
+        self.stopping.set()
+
+        if self.is_alive():
+            self.join()